@@ -7,26 +7,30 @@ from flask import Flask, render_template, make_response, flash, request, redirec
 from library.constants import *
 from library.config import Config
 from library.db import DatabaseClient
-from library.bot_analyzer import BotAnalyzer
+from library.jobs import JobManager
 
 
 # read config
 cfg = Config()
 
-# glocal control thread for bot
-bot_analyzer = None
+# queued and running bot_analyzer jobs
+job_manager = JobManager(crawl_workers=cfg.crawl_workers,
+                         analysis_workers=cfg.analysis_workers,
+                         max_jobs=cfg.max_jobs)
 
 
-params = {
-    'keyword': None,
-    'industry': None,
-    'sql_query': None,
-    'n_components': None,
-    'n_features': None,
-    'stop_words': None,
-    'n_top_words': None,
-    'n_topic_words': None,
-}
+# names of the form params, read into a new dict per request (requests are served concurrently)
+PARAM_NAMES = [
+    'keyword',
+    'industry',
+    'sql_query',
+    'filter_keywords',
+    'n_components',
+    'n_features',
+    'stop_words',
+    'n_top_words',
+    'n_topic_words',
+]
 
 
 @app.route('/')
@@ -36,9 +40,7 @@ def index():
 
 @app.route('/settings')
 def settings():
-    global params
-    for name in params.keys():
-        params[name] = getattr(cfg, name)
+    params = {name: getattr(cfg, name) for name in PARAM_NAMES}
     return render_template('settings.html',
                            industry_options=INDUSTRY_OPTIONS,
                            default_values=params,
@@ -46,20 +48,12 @@ def settings():
 
 @app.route('/run', methods=['POST'])
 def run():
-    global params
-    global bot_analyzer
-
     # get params in string format
-    for name in params.keys():
-        params[name] = request.form.get(name, type=str)
-
-    # if still processing
-    if (bot_analyzer) and (bot_analyzer.status in BotAnalyzerStatus.PROCESSING):
-        return render_template('error.html', error=bot_analyzer.status), 400
+    params = {name: request.form.get(name, type=str) for name in PARAM_NAMES}
 
-    # initialize and run bot_analyzer
+    # queue bot_analyzer (run alongside other jobs)
     try:
-        bot_analyzer = BotAnalyzer(**params)
+        job_id = job_manager.submit(**params)
     except Exception as err:
         flash(err, category='warning')
         return make_response(render_template('settings.html',
@@ -67,38 +61,63 @@ def run():
                                              default_values=params,
                                              input_val_description=INPUT_VAL_DESCRIPTION,
                                             ), 400)
-    bot_analyzer.setDaemon(True)
-    bot_analyzer.start()
 
-    return render_template('processing.html')
+    return render_template('processing.html', job_id=job_id)
+
+
+def get_job_id(job_id):
+    # latest job if not specified
+    return job_id or job_manager.latest_job_id
 
 
 @app.route('/stop')
-def stop():
-    if bot_analyzer:
-        bot_analyzer.stop()
-    return redirect(url_for('result', result=None))
+@app.route('/stop/<job_id>')
+def stop(job_id=None):
+    job_id = get_job_id(job_id)
+    job_manager.stop(job_id)
+    return redirect(url_for('result', job_id=job_id))
 
 
 @app.route('/status')
-def status():
-    if bot_analyzer:
-        return make_response({'status': bot_analyzer.status, 'progress': bot_analyzer.progress})
-    return redirect(url_for('result', result=None))
+@app.route('/status/<job_id>')
+def status(job_id=None):
+    job_status = job_manager.get_status(get_job_id(job_id))
+    if job_status is None:
+        return make_response({'error': f'job not found ({job_id})'}, 404)
+    return make_response(job_status)
+
+
+def get_result_view(job_result):
+    # parts of a saved result shown in result.html, topic ratios are read from disk while rendering
+    models = {model_type: dict(model_meta, topic_ratios=job_result.iter_topic_ratios(model_type))
+              for model_type, model_meta in job_result.models.items()}
+    n_topics = len(next(iter(job_result.models.values()))['topic_words'])
+    return {
+        'top_words': job_result.top_words,
+        'models': models,
+        'topic_ratio_columns': ['id', 'title', 'link'] + [f'topic #{i+1}' for i in range(n_topics)],
+    }
 
 
 @app.route('/result')
-def result():
-    if bot_analyzer is None or bot_analyzer.status == BotAnalyzerStatus.IDLE:
+@app.route('/result/<job_id>')
+def result(job_id=None):
+    job_id = get_job_id(job_id)
+    job = job_manager.get(job_id)
+    if job is None or job.status == BotAnalyzerStatus.COMPLETE:
+        # completed results are loaded from disk (also those of jobs run before restart)
+        job_result = job_manager.get_result(job_id)
+        if job_result is None:
+            return render_template('result.html', result=None)
+        return render_template('result.html', result=get_result_view(job_result))
+    elif job.status == BotAnalyzerStatus.IDLE:
         return render_template('result.html', result=None)
-    elif bot_analyzer.status in BotAnalyzerStatus.PROCESSING:
-        return render_template('processing.html')
-    elif bot_analyzer.status == BotAnalyzerStatus.COMPLETE:
-        return render_template('result.html', result=bot_analyzer.result)
-    elif bot_analyzer.status == BotAnalyzerStatus.ERROR:
-        return render_template('error.html', error=bot_analyzer.error, traceback=bot_analyzer.traceback), 500
+    elif job.status in BotAnalyzerStatus.PROCESSING:
+        return render_template('processing.html', job_id=job.job_id)
+    elif job.status == BotAnalyzerStatus.ERROR:
+        return render_template('error.html', error=job.error, traceback=job.traceback), 500
     else:
-        return make_response(f'Unhandled status ({bot_analyzer.status})', 500)
+        return make_response(f'Unhandled status ({job.status})', 500)
 
 @app.route('/download')
 def download():
@@ -107,15 +126,53 @@ def download():
     with open(filepath, 'rb') as f:
         csv_data = f.read()
     return Response(csv_data, mimetype='text/csv',
-                    headers={'Content-disposition':f'attachment;filename={filename}'})
+                    headers={'Content-disposition':f'attachment;filename={os.path.basename(filename)}'})
+
+def get_database_table(args):
+    # one page of articles (ordered by id) with the approximate number of all selected articles
+    sql_query = args.get('sql_query', default=cfg.sql_query, type=str)
+    filter_keywords = args.get('filter_keywords', default=cfg.filter_keywords, type=str)
+    limit = min(max(args.get('limit', default=cfg.table_page_size, type=int), 1), 1000)
+    after_id = args.get('after', type=int)
+    before_id = args.get('before', type=int)
+
+    db_client = DatabaseClient(cfg.db_filepath)
+    try:
+        filtered_query, params = db_client.filter_by_keywords(sql_query, filter_keywords.split(','))
+        df, has_more = db_client.load_page(filtered_query, params, limit=limit, after_id=after_id, before_id=before_id)
+        n_rows = db_client.count_rows(filtered_query, params, max_count=cfg.table_count_limit)
+    finally:
+        db_client.close()
+
+    if before_id is not None:
+        has_next, has_previous = True, has_more
+    else:
+        has_next, has_previous = has_more, after_id is not None
+    ids = df['id'].tolist()
+    return {
+        'sql_query': sql_query,
+        'filter_keywords': filter_keywords,
+        'limit': limit,
+        'columns': list(df.columns),
+        # NULL as None (not NaN) for json
+        'data': df.astype(object).where(df.notnull(), None).values.tolist(),
+        'next_after': ids[-1] if has_next and ids else None,
+        'previous_before': ids[0] if has_previous and ids else None,
+        'n_rows': min(n_rows, cfg.table_count_limit),
+        'n_rows_capped': n_rows > cfg.table_count_limit,
+    }
 
 @app.route('/database_table')
 def database_table():
-    sql_query = request.args.get('sql_query', default=cfg.sql_query, type=str)
-    db_table = DatabaseClient(cfg.db_filepath)\
-               .load_dataset(sql_query)\
-               .drop(columns=['content'])\
-               .to_dict(orient='split')
+    db_table = get_database_table(request.args)
     return render_template('database_table.html',
-                           sql_query=sql_query,
+                           sql_query=db_table['sql_query'],
+                           filter_keywords=db_table['filter_keywords'],
                            db_table=db_table)
+
+@app.route('/api/database_table')
+def database_table_api():
+    try:
+        return make_response(get_database_table(request.args))
+    except Exception as err:
+        return make_response({'error': str(err)}, 400)
@@ -0,0 +1,56 @@
+import json
+import hashlib
+import numpy as np
+
+import pyLDAvis
+from pyLDAvis import sklearn as sklearn_lda
+
+
+class CachedPreparedData:
+    # prepared data loaded from cache, rendered by pyLDAvis.save_html the same as PreparedData
+    def __init__(self, json_str):
+        self.json_str = json_str
+
+    def to_json(self):
+        return self.json_str
+
+
+def _circle_layout(topic_term_dists):
+    # used instead of MDS in summary mode, places topics on a circle
+    n_topics = len(topic_term_dists)
+    angles = 2 * np.pi * np.arange(n_topics) / n_topics
+    return np.column_stack([np.cos(angles), np.sin(angles)])
+
+
+def _fingerprint(lda_model, dtm, vectorizer, mode):
+    h = hashlib.sha256()
+    h.update(mode.encode('utf-8'))
+    h.update(np.ascontiguousarray(lda_model.components_).tobytes())
+    dtm = dtm.tocsr()
+    for array in [dtm.indptr, dtm.indices, dtm.data]:
+        h.update(np.ascontiguousarray(array).tobytes())
+    h.update(json.dumps(vectorizer.get_feature_names(), ensure_ascii=False).encode('utf-8'))
+    return h.hexdigest()
+
+
+def prepare(lda_model, dtm, vectorizer, cache, mode='full', n_jobs=-1):
+    # cache: ResultCache of prepared data (as_json), mode: 'full' or 'summary' (skip inter-topic distance MDS)
+    assert mode in ['full', 'summary'], f'Wrong ldavis mode ({mode})'
+
+    # reuse prepared data of the same model and data
+    key = _fingerprint(lda_model, dtm, vectorizer, mode)
+    json_str = cache.get(key)
+    if json_str is not None:
+        return CachedPreparedData(json_str)
+
+    mds = _circle_layout if mode == 'summary' else 'pcoa'
+    # n_jobs: processes used by pyLDAvis for term relevance (its own default is -1)
+    prepared = sklearn_lda.prepare(lda_model, dtm, vectorizer, mds=mds, n_jobs=n_jobs)
+    json_str = prepared.to_json()
+    cache.put(key, json_str, [])
+
+    return CachedPreparedData(json_str)
+
+
+def save_html(prepared, filepath):
+    pyLDAvis.save_html(prepared, filepath)
@@ -1,22 +1,47 @@
+import numpy as np
 import pandas as pd
 
 from sklearn.manifold import TSNE
+from sklearn.neighbors import NearestNeighbors
 import plotly.graph_objects as go
 
 
-def prepare_tsne_groups(nmf_model, tfidf, data_df, topics_dict=None):
+def _fit_tsne(embedding, max_samples, n_neighbors=5):
+    if not max_samples or len(embedding) <= max_samples:
+        return TSNE(random_state=1).fit_transform(embedding)
+
+    # fit tsne on landmark samples only,
+    # then place the others at the weighted mean of their nearest landmarks
+    rng = np.random.RandomState(1)
+    landmarks = np.sort(rng.choice(len(embedding), max_samples, replace=False))
+    landmark_embedding = TSNE(random_state=1).fit_transform(embedding[landmarks])
+
+    # fewer neighbors if there are fewer landmarks (small max_samples)
+    nn = NearestNeighbors(n_neighbors=min(n_neighbors, max_samples)).fit(embedding[landmarks])
+    distances, indices = nn.kneighbors(embedding)
+    weights = 1 / (distances + 1e-6)
+    weights /= weights.sum(axis=1, keepdims=True)
+    tsne_embedding = (landmark_embedding[indices] * weights[:, :, np.newaxis]).sum(axis=1)
+    tsne_embedding[landmarks] = landmark_embedding
+    return tsne_embedding
+
+
+def prepare_tsne_groups(nmf_embedding, data_df, topics_dict=None, max_samples=None):
+    # nmf_embedding: topic ratios per article (already transformed by the fitted model)
+    # max_samples: number of articles to fit tsne on (others are placed by nearest landmarks)
+
     # scale nmf embeddings
-    nmf_embedding = nmf_model.transform(tfidf)
-    nmf_embedding = (nmf_embedding-nmf_embedding.mean(axis=0)) / nmf_embedding.std(axis=0)
+    std = nmf_embedding.std(axis=0)
+    std[std == 0] = 1
+    nmf_embedding = (nmf_embedding-nmf_embedding.mean(axis=0)) / std
 
     # fit tsne
-    tsne = TSNE(random_state=1)
-    tsne_embedding = tsne.fit_transform(nmf_embedding)
+    tsne_embedding = _fit_tsne(nmf_embedding, max_samples)
 
     # prepare result
     tsne_embedding = pd.DataFrame(tsne_embedding, columns=['x','y'])
-    tsne_embedding['title'] = data_df['title']
-    tsne_embedding['link'] = data_df['link']
+    tsne_embedding['title'] = data_df['title'].values
+    tsne_embedding['link'] = data_df['link'].values
     tsne_embedding['topic'] = nmf_embedding.argmax(axis=1)
     if topics_dict:
         tsne_embedding['topic'] = tsne_embedding['topic'].replace(topics_dict)
@@ -49,4 +74,5 @@ def save_html(groups, filepath):
     ]
 
     fig = go.Figure(data=data, layout=layout)
-    fig.write_html(filepath, auto_open=True)
+    # load plotly.js from CDN instead of embedding it in every file
+    fig.write_html(filepath, auto_open=False, include_plotlyjs='cdn')
@@ -1,23 +1,79 @@
 import os
+import json
+import warnings
 import pickle
+import hashlib
 import numpy as np
 import pandas as pd
+import scipy.sparse as sp
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
-import MeCab
-import pyLDAvis
-from pyLDAvis import sklearn as sklearn_lda
 from sklearn.decomposition import NMF, LatentDirichletAllocation
-from sklearn.feature_extraction.text import TfidfVectorizer, CountVectorizer
+from sklearn.exceptions import ConvergenceWarning
+from sklearn.feature_extraction.text import TfidfTransformer, CountVectorizer
+try:
+    # optional, needed for blas_threads
+    from threadpoolctl import threadpool_limits
+except ImportError:
+    threadpool_limits = None
 
 from library.constants import *
 from library.config import Config
-from library.db import DatabaseClient
+from library.db import DatabaseClient, content_hash
+from library.tokenizer import Tokenizer
+from library.result_cache import ResultCache
+from library.vectorizer import HashingCountVectorizer, limit_features, _pass_through
+from library.dtm_store import DtmStore
 from library import NMFvis
+from library import LDAvis
 
 # read config
 cfg = Config()
 
 
+# bump to invalidate cached results when the analysis changes
+RESULT_CACHE_VERSION = 2
+
+# output files of a model result and the directories their filenames are relative to
+OUTPUT_ROOT_DIRS = {
+    'topic_words_filename': 'data',
+    'topic_ratios_filename': 'data',
+    'visualization_filename': 'app/static',
+}
+
+
+def _call_with_budget(blas_threads, method, *args):
+    # method: bound method of Analyzer (ex. run_model), called with args in a worker process
+    # limit BLAS/OpenMP threads so that models fitted in parallel don't starve each other
+    if blas_threads > 0 and threadpool_limits is not None:
+        with threadpool_limits(limits=blas_threads):
+            return method(*args)
+    return method(*args)
+
+
+def top_k_indices(values, k):
+    # indices of the k largest values in descending order (ties keep index order)
+    values = np.asarray(values)
+    if k < len(values):
+        # partial selection, then sort the candidates only
+        kth_value = np.partition(values, len(values)-k)[len(values)-k]
+        candidates = np.flatnonzero(values >= kth_value)
+    else:
+        candidates = np.arange(len(values))
+    return candidates[np.argsort(-values[candidates], kind='stable')][:k]
+
+
+class StreamedCorpus:
+    def __init__(self, analyzer, db_client, article_ids=None):
+        # re-iterable corpus, each iteration streams articles from db again (see Analyzer.iter_corpus)
+        self.analyzer = analyzer
+        self.db_client = db_client
+        self.article_ids = article_ids
+
+    def __iter__(self):
+        return self.analyzer.iter_corpus(self.db_client, self.article_ids)
+
+
 class Analyzer:
     def __init__(self,
                  sql_query:str,
@@ -25,7 +81,9 @@ class Analyzer:
                  n_features:int,
                  stop_words,
                  n_top_words:int,
-                 n_topic_words:int):
+                 n_topic_words:int,
+                 filter_keywords=None,
+                 output_dir=''):
         self.sql_query = sql_query
         self.n_components = n_components
         self.n_features = n_features
@@ -37,132 +95,530 @@ class Analyzer:
             self.stop_words = []
         self.n_top_words = n_top_words
         self.n_topic_words = n_topic_words
+        # sub directory of data/ and app/static/ for output files (ex. one per job)
+        self.output_dir = output_dir
+        # analyze articles containing all of these words only
+        if type(filter_keywords) is str:
+            self.filter_keywords = filter_keywords.split(',')
+        elif type(filter_keywords) is list:
+            self.filter_keywords = filter_keywords
+        else:
+            self.filter_keywords = []
+        self.tokenizer = Tokenizer(cfg.mecab_dictionary_path, self.stop_words)
 
     def tokenize(self, text):
-        text = str(text).lower()
-        m = MeCab.Tagger(cfg.mecab_dictionary_path)
-        words = m.parse(text)
-        clean_tokens = []
-        for row in words.split('\n'):
-            word = row.split('\t')[0]
-            if word == 'EOS':
-                break
+        return self.tokenizer.tokenize(text)
+
+    def tokenize_corpus(self, data_df, db_client, filter_stop_words=True, executor=None):
+        # executor: tokenizer worker pool shared across calls (see Tokenizer.pool)
+        # no article id to key the token cache by
+        if 'id' not in data_df.columns:
+            return self.tokenizer.tokenize_many(data_df['content'], filter_stop_words=filter_stop_words,
+                                                n_jobs=cfg.tokenizer_processes, executor=executor)
+
+        settings_hash = self.tokenizer.fingerprint
+        cached = db_client.load_tokens(data_df['id'], settings_hash)
+        if 'content_hash' in data_df.columns:
+            content_hashes = data_df['content_hash']
+        else:
+            content_hashes = [content_hash(text) for text in data_df['content']]
+
+        # look up cached nouns of unchanged articles
+        nouns_list = []
+        new_records = []
+        for article_id, text, text_hash in zip(data_df['id'], data_df['content'], content_hashes):
+            hit = cached.get(article_id)
+            if hit is not None and hit[0] == text_hash:
+                nouns_list.append(hit[1])
             else:
-                if word in self.stop_words:
-                    continue
-                prop = row.split('\t')[1]
-                if prop.split(',')[0] != '名詞':
-                    continue
-                elif prop.split(',')[1] in ['数', '非自立', '接続詞的', '接尾', '代名詞']:
-                    continue
-                elif prop.split(',')[2] in ['組織', '人名']:
-                    continue
-                else:
-                    clean_tokens.append(word)
-        return clean_tokens
-
-    def vectorize(self, data):
-        # Use tf-idf features for NMF.
-        self.tfidf_vectorizer = TfidfVectorizer(max_df=0.95, min_df=2,
-                                                max_features=self.n_features,
-                                                tokenizer=self.tokenize)
-        self.tfidf = self.tfidf_vectorizer.fit_transform(data)
+                nouns_list.append(None)
+                new_records.append((article_id, text_hash, text))
+
+        # run MeCab on new or changed articles only
+        new_nouns = self.tokenizer.tokenize_many([text for _, _, text in new_records],
+                                                 filter_stop_words=False,
+                                                 n_jobs=cfg.tokenizer_processes,
+                                                 executor=executor)
+        new_nouns_iter = iter(new_nouns)
+        nouns_list = [nouns if nouns is not None else next(new_nouns_iter) for nouns in nouns_list]
+        if new_records:
+            db_client.save_tokens([(article_id, text_hash, nouns) for (article_id, text_hash, _), nouns
+                                   in zip(new_records, new_nouns)], settings_hash)
+        print(f'tokenized:{len(new_records)} cached:{len(nouns_list)-len(new_records)}')
+
+        # stop words are applied on read so that changing them keeps the cache valid
+        if not filter_stop_words:
+            return nouns_list
+        return [self.tokenizer.filter_stop_words(nouns) for nouns in nouns_list]
+
+    def _iter_dataset(self, db_client, columns):
+        sql_query, params = db_client.filter_by_keywords(self.sql_query, self.filter_keywords)
+        return db_client.iter_dataset(sql_query, cfg.chunk_size, params=params, columns=columns)
+
+    def iter_corpus(self, db_client, article_ids=None, filter_stop_words=True):
+        # streams tokenized articles in the order of data_df, one chunk of contents at a time
+        # article_ids: tokenize these articles only
+        self.n_tokens = 0
+        # one pool of tokenizer processes for all chunks
+        with self.tokenizer.pool(cfg.tokenizer_processes) as executor:
+            for chunk_df in self._iter_dataset(db_client, columns=['id', 'content']):
+                if article_ids is not None:
+                    chunk_df = chunk_df[chunk_df['id'].isin(article_ids)]
+                for tokens in self.tokenize_corpus(chunk_df, db_client, filter_stop_words=filter_stop_words,
+                                                   executor=executor):
+                    self.n_tokens += len(tokens)
+                    yield tokens
+
+    @property
+    def vectorizer_settings(self):
+        # settings changing the document-term matrix
+        if cfg.vectorizer == 'hashing':
+            return [cfg.vectorizer, cfg.hashing_n_features]
+        return [cfg.vectorizer]
+
+    def fingerprint(self, data_df):
+        # identifies a result by the selected articles and the analysis params
+        h = hashlib.sha256()
+        params = {
+            'version': RESULT_CACHE_VERSION,
+            'n_components': self.n_components,
+            'n_features': self.n_features,
+            'stop_words': sorted(set(self.stop_words)),
+            'n_top_words': self.n_top_words,
+            'n_topic_words': self.n_topic_words,
+            'tokenizer': self.tokenizer.fingerprint,
+            'vectorizer': self.vectorizer_settings,
+            # changes the saved visualization
+            'vis_max_samples': cfg.vis_max_samples,
+            'ldavis_mode': cfg.ldavis_mode,
+        }
+        h.update(json.dumps(params, sort_keys=True).encode('utf-8'))
+        for row in zip(data_df['id'], data_df['title'], data_df['link'], data_df['content_hash']):
+            h.update(json.dumps([str(v) for v in row], ensure_ascii=False).encode('utf-8'))
+        return h.hexdigest()
+
+    @staticmethod
+    def _get_oov_rate(tf, n_tokens):
+        # share of tokens missing from the fitted vocabulary (tf only counts known words)
+        return 1 - tf.sum() / n_tokens if n_tokens else 0.0
+
+    @staticmethod
+    def _get_model_state_cache():
+        # bounded like the result cache, but the latest models are always kept for incremental updates
+        return ResultCache(cfg.model_state_dir,
+                           max_entries=max(cfg.result_cache_size, 1),
+                           max_bytes=cfg.result_cache_mb*1024*1024)
+
+    def _get_model_state_key(self):
+        # models are kept per query and analysis params
+        params = {
+            'version': RESULT_CACHE_VERSION,
+            'sql_query': self.sql_query,
+            'filter_keywords': sorted(set(self.filter_keywords)),
+            'n_components': self.n_components,
+            'n_features': self.n_features,
+            'stop_words': sorted(set(self.stop_words)),
+            'tokenizer': self.tokenizer.fingerprint,
+            'vectorizer': self.vectorizer_settings,
+        }
+        return hashlib.sha256(json.dumps(params, sort_keys=True).encode('utf-8')).hexdigest()
+
+    def load_model_state(self):
+        return self._get_model_state_cache().get(self._get_model_state_key())
+
+    def save_model_state(self, models, topic_ratios, oov_rate):
+        # NOTE: rows of tf and topic_ratios are in the order of data_df
+        state = {
+            'content_hashes': dict(zip(self.data_df['id'].tolist(), self.data_df['content_hash'])),
+            'tf_vectorizer': self.tf_vectorizer,
+            'tfidf_transformer': self.tfidf_transformer,
+            'tf': self.tf,
+            'models': models,
+            'topic_ratios': topic_ratios,
+            'oov_rate': oov_rate,
+        }
+        # replaces the models of the previous run
+        self._get_model_state_cache().put(self._get_model_state_key(), state, [], replace=True)
+
+    def vectorize_incremental(self, state, db_client):
+        # reuse the fitted vocabulary and vectorize new articles only,
+        # returns False if models must be refit from scratch
+        current_hashes = dict(zip(self.data_df['id'].tolist(), self.data_df['content_hash']))
+        if any(current_hashes.get(article_id) != text_hash
+               for article_id, text_hash in state['content_hashes'].items()):
+            print('articles changed or removed since last fit')
+            return False
+
+        is_new_row = ~self.data_df['id'].isin(list(state['content_hashes'].keys())).values
+
+        self.tf_vectorizer = state['tf_vectorizer']
+        self.tfidf_transformer = state['tfidf_transformer']
+        self.feature_names = self.tf_vectorizer.get_feature_names()
+        new_ids = self.data_df['id'][is_new_row].tolist()
+        if new_ids:
+            tf_new = self.tf_vectorizer.transform(self.iter_corpus(db_client, article_ids=new_ids))
+        else:
+            # nothing to tokenize
+            tf_new = sp.csr_matrix((0, state['tf'].shape[1]), dtype=state['tf'].dtype)
+            self.n_tokens = 0
+
+        # refit if new articles use many words out of the vocabulary
+        drift = self._get_oov_rate(tf_new, self.n_tokens) - state['oov_rate']
+        print(f'n_new_samples:{is_new_row.sum()} vocabulary drift:{drift:.3f}')
+        if drift > cfg.refit_threshold:
+            return False
+
+        # stack previous and new rows, then reorder them as data_df
+        old_rows = {article_id: i for i, article_id in enumerate(state['content_hashes'].keys())}
+        n_old = len(old_rows)
+        new_rows = iter(range(n_old, n_old + is_new_row.sum()))
+        self.row_order = [next(new_rows) if is_new else old_rows[article_id]
+                          for article_id, is_new in zip(self.data_df['id'].tolist(), is_new_row)]
+        self.is_new_row = is_new_row
+        self.tf = sp.vstack([state['tf'], tf_new]).tocsr()[self.row_order]
+        self.tfidf = self.tfidf_transformer.transform(self.tf)
+        return True
+
+    def vectorize(self, corpus):
+        # corpus is an iterable of tokenized documents (see iter_corpus),
+        # read once by CountVectorizer and twice in hashing mode
         # Use tf (raw term count) features for LDA.
-        self.tf_vectorizer = CountVectorizer(max_df=0.95, min_df=2,
-                                             max_features=self.n_features,
-                                             tokenizer=self.tokenize)
-        self.tf = self.tf_vectorizer.fit_transform(data)
+        if cfg.vectorizer == 'hashing':
+            # bounded memory for large datasets
+            self.tf_vectorizer = HashingCountVectorizer(max_df=0.95, min_df=2,
+                                                        max_features=self.n_features,
+                                                        n_hash_features=cfg.hashing_n_features,
+                                                        batch_size=cfg.chunk_size,
+                                                        n_jobs=cfg.vectorizer_processes)
+        else:
+            self.tf_vectorizer = CountVectorizer(max_df=0.95, min_df=2,
+                                                 max_features=self.n_features,
+                                                 analyzer=_pass_through)
+        self.tf = self.tf_vectorizer.fit_transform(corpus)
+        self._fit_tfidf()
+
+    def vectorize_from_store(self, db_client):
+        # slice the stored term counts of the selected articles (tokenizing new or changed ones only),
+        # then select features like CountVectorizer
+        store = DtmStore(cfg.dtm_store_dir, self.tokenizer.fingerprint)
+        article_ids = self.data_df['id'].tolist()
+        missing_ids = store.get_missing(article_ids, self.data_df['content_hash'].tolist())
+        if missing_ids:
+            missing_hashes = self.data_df['content_hash'][self.data_df['id'].isin(missing_ids)].tolist()
+            store.append(zip(missing_ids, missing_hashes,
+                             self.iter_corpus(db_client, article_ids=missing_ids, filter_stop_words=False)),
+                         batch_size=cfg.chunk_size)
+        print(f'dtm store: appended:{len(missing_ids)} stored:{len(article_ids)-len(missing_ids)}')
+
+        X = store.get_matrix(article_ids)
+        self.tf, feature_names = limit_features(X, store.vocabulary,
+                                                max_df=0.95, min_df=2,
+                                                max_features=self.n_features,
+                                                excluded_words=self.stop_words)
+        # tokens left after removing stop words (for the out-of-vocabulary rate)
+        total_counts = np.asarray(X.sum(axis=0)).ravel()
+        self.n_tokens = int(sum(count for word, count in zip(store.vocabulary, total_counts)
+                                if word not in self.tokenizer.stop_words))
+        # same as a CountVectorizer fitted on these articles (used to transform new ones)
+        self.tf_vectorizer = CountVectorizer(vocabulary=feature_names, analyzer=_pass_through)
+        self._fit_tfidf()
+
+    def vectorize_dataset(self, db_client):
+        assert cfg.vectorizer in ['count', 'hashing', 'store'], f'Wrong vectorizer ({cfg.vectorizer})'
+        if cfg.vectorizer == 'store':
+            self.vectorize_from_store(db_client)
+        else:
+            # tokenize data (reusing cached tokens of unchanged articles) while vectorizing
+            self.vectorize(StreamedCorpus(self, db_client))
+
+    def _fit_tfidf(self):
+        # Use tf-idf features for NMF.
+        # Derived from the count matrix, same as TfidfVectorizer with the same params.
+        self.tfidf_transformer = TfidfTransformer()
+        self.tfidf = self.tfidf_transformer.fit_transform(self.tf)
+        # both matrices share the same vocabulary
+        self.feature_names = self.tf_vectorizer.get_feature_names()
 
     def get_top_words(self):
-        words = self.tf_vectorizer.get_feature_names()
-        total_counts = np.zeros(len(words))
-        for t in self.tf:
-            total_counts += t.toarray()[0]
-        top_words = sorted((zip(words, total_counts)), key=lambda x:x[1], reverse=True)[0:self.n_top_words]
+        # total count of each word (sparse column sums)
+        total_counts = np.asarray(self.tf.sum(axis=0), dtype=float).ravel()
+        top_words = [(self.feature_names[i], total_counts[i]) for i in top_k_indices(total_counts, self.n_top_words)]
         return top_words
 
     def get_topic_words(self, model, feature_names):
         topic_words = []
         for topic in model.components_:
-            topic_words.append([feature_names[i] for i in topic.argsort()[:-self.n_topic_words-1:-1]])
+            topic_words.append([feature_names[i] for i in top_k_indices(topic, self.n_topic_words)])
         return topic_words
 
+    def create_model(self, model_type, n_components=None):
+        assert model_type in ['nmf', 'lda'], f'Wrong model type ({model_type})'
+        if n_components is None:
+            n_components = self.n_components
+        if model_type == 'nmf':
+            return NMF(n_components=n_components,
+                       random_state=1,
+                       alpha=.1,
+                       l1_ratio=.5)
+        elif model_type == 'lda':
+            return LatentDirichletAllocation(n_components=n_components,
+                                             max_iter=5,
+                                             learning_method='online',
+                                             learning_offset=50.,
+                                             random_state=0)
+
     def fit_model(self, model_type):
         assert model_type in ['nmf', 'lda'], f'Wrong model type ({model_type})'
         if model_type == 'nmf':
             # fit model
-            model = NMF(n_components=self.n_components,
-                        random_state=1,
-                        alpha=.1,
-                        l1_ratio=.5)
+            model = self.create_model(model_type)
             model.fit(self.tfidf)
             # get top words per topic
             topic_words = self.get_topic_words(model=model,
-                                               feature_names=self.tfidf_vectorizer.get_feature_names())
+                                               feature_names=self.feature_names)
             # get topic ratios per article
             topic_ratios = model.transform(self.tfidf)
 
         elif model_type == 'lda':
             # fit model
-            model = LatentDirichletAllocation(n_components=self.n_components,
-                                              max_iter=5,
-                                              learning_method='online',
-                                              learning_offset=50.,
-                                              random_state=0)
+            model = self.create_model(model_type)
             model.fit(self.tf)
             # get top words per topic
             topic_words = self.get_topic_words(model=model,
-                                               feature_names=self.tf_vectorizer.get_feature_names())
+                                               feature_names=self.feature_names)
             # get topic ratios per article
             topic_ratios = model.transform(self.tf)
 
         return model, topic_words, topic_ratios
 
+    def update_model(self, model_type, state):
+        # update the previous model with new articles (see vectorize_incremental),
+        # topic ratios of all articles are given by the updated topics
+        assert model_type in ['nmf', 'lda'], f'Wrong model type ({model_type})'
+        model = state['models'][model_type]
+        X = self.tfidf if model_type == 'nmf' else self.tf
+        X_new = X[self.is_new_row]
+
+        if X_new.shape[0] == 0:
+            # no new articles, the previous model and ratios are still valid
+            topic_ratios = state['topic_ratios'][model_type][self.row_order]
+        elif model_type == 'nmf':
+            # a few iterations over all articles, starting from the current topics and ratios
+            # (refitting H on new articles only would drift away from the topics of the others)
+            topic_ratios = np.vstack([state['topic_ratios'][model_type], model.transform(X_new)])[self.row_order]
+            if topic_ratios.max() > 0:
+                model.set_params(init='custom', max_iter=cfg.incremental_max_iter)
+                with warnings.catch_warnings():
+                    # not converged within max_iter as expected
+                    warnings.simplefilter('ignore', ConvergenceWarning)
+                    topic_ratios = model.fit_transform(X, W=topic_ratios, H=model.components_.copy())
+        elif model_type == 'lda':
+            # online update with new articles, then ratios of all articles from the updated topics
+            model.partial_fit(X_new)
+            topic_ratios = model.transform(X)
+
+        # get top words per topic
+        topic_words = self.get_topic_words(model=model,
+                                           feature_names=self.feature_names)
+
+        return model, topic_words, topic_ratios
+
+    def get_coherence(self, topic_words):
+        # UMass coherence averaged over word pairs and topics (higher is better)
+        vocabulary = self.tf_vectorizer.vocabulary_
+        doc_term = (self.tf > 0).astype(float).tocsc()
+        scores = []
+        for words in topic_words:
+            idx = [vocabulary[word] for word in words]
+            sub = doc_term[:, idx]
+            co_doc_counts = (sub.T @ sub).toarray()
+            doc_counts = np.diag(co_doc_counts)
+            pair_scores = [np.log((co_doc_counts[m, l] + 1) / doc_counts[l])
+                           for m in range(1, len(idx)) for l in range(m)]
+            scores.append(np.mean(pair_scores) if pair_scores else 0.0)
+        return float(np.mean(scores))
+
+    def score_model(self, model_type, n_components):
+        # fit a candidate model and return its quality scores
+        model = self.create_model(model_type, n_components)
+        if model_type == 'nmf':
+            model.fit(self.tfidf)
+            scores = {'reconstruction_error': model.reconstruction_err_}
+        elif model_type == 'lda':
+            model.fit(self.tf)
+            scores = {'perplexity': model.perplexity(self.tf)}
+        scores['coherence'] = self.get_coherence(self.get_topic_words(model=model,
+                                                                      feature_names=self.feature_names))
+        return scores
+
     def create_topic_ratios_df(self, topic_ratios):
-        df = pd.DataFrame(columns=[f'topic #{i+1}' for i in range(len(topic_ratios[0]))])
-        for i, ratios in enumerate(topic_ratios):
-            df.loc[i] = list(ratios)
+        df = pd.DataFrame(topic_ratios,
+                          columns=[f'topic #{i+1}' for i in range(topic_ratios.shape[1])],
+                          index=self.data_df.index)
         df = pd.concat([self.data_df.loc[:, ['id', 'title', 'link']], df], axis=1)
         return df
 
+    def _get_output_filename(self, filename, root_dir):
+        # path relative to root_dir (used in urls)
+        filename = os.path.join(self.output_dir, filename) if self.output_dir else filename
+        os.makedirs(os.path.dirname(os.path.join(root_dir, filename)), exist_ok=True)
+        return filename
+
+    def _get_output_filepath(self, filepath):
+        # filepath of an output file of another run (ex. restored from cache) in the output directory of this run
+        root_dir = 'app/static' if filepath.startswith('app/static') else 'data'
+        return os.path.join(root_dir, self._get_output_filename(os.path.basename(filepath), root_dir))
+
     def save_topic_words(self, topic_words, model_type):
-        filename = f'{model_type}_topic_words.csv'
-        df = pd.DataFrame(columns=['topic'] + [f'word #{i+1}' for i in range(len(topic_words[0]))])
-        for i, words in enumerate(topic_words):
-            df.loc[i] = [i] + list(words)
+        filename = self._get_output_filename(f'{model_type}_topic_words.csv', 'data')
+        df = pd.DataFrame([[i] + list(words) for i, words in enumerate(topic_words)],
+                          columns=['topic'] + [f'word #{i+1}' for i in range(len(topic_words[0]))])
         df.to_csv(os.path.join('data', filename), index=False, encoding='sjis')
         return filename
 
     def save_topic_ratios(self, topic_ratios_df, model_type):
-        filename = f'{model_type}_topic_ratios.csv'
+        filename = self._get_output_filename(f'{model_type}_topic_ratios.csv', 'data')
         # Open file to ignore UnicodeEncodeError.
         with open(os.path.join('data', filename), mode='w', encoding='shift-jis', errors='ignore') as f:
             topic_ratios_df.to_csv(f, index=False)
         return filename
 
-    def save_visualization(self, model, model_type):
+    def save_visualization(self, model, model_type, topic_ratios):
         if model_type == 'lda':
-            ldavis_result = sklearn_lda.prepare(model, self.tf, self.tf_vectorizer)
-            filename = 'lda_visualization.html'
-            pyLDAvis.save_html(ldavis_result, os.path.join('app/static/', filename))
+            ldavis_result = LDAvis.prepare(model, self.tf, self.tf_vectorizer,
+                                           cache=ResultCache(cfg.ldavis_cache_dir,
+                                                             max_entries=cfg.result_cache_size,
+                                                             max_bytes=cfg.result_cache_mb*1024*1024,
+                                                             as_json=True),
+                                           mode=cfg.ldavis_mode,
+                                           n_jobs=cfg.ldavis_n_jobs)
+            filename = self._get_output_filename('lda_visualization.html', 'app/static')
+            LDAvis.save_html(ldavis_result, os.path.join('app/static/', filename))
         elif model_type == 'nmf':
-            tsne_groups = NMFvis.prepare_tsne_groups(model, self.tfidf, self.data_df)
-            filename = 'nmf_visualization.html'
+            tsne_groups = NMFvis.prepare_tsne_groups(topic_ratios, self.data_df,
+                                                     max_samples=cfg.vis_max_samples)
+            filename = self._get_output_filename('nmf_visualization.html', 'app/static')
             NMFvis.save_html(tsne_groups, os.path.join('app/static/', filename))
         return filename
 
-    def run(self, db_client=None):
+    def run_model(self, model_type, state=None):
+        # fit (or update with state) a model, then save its csv and visualization
+        if state is not None:
+            model, topic_words, topic_ratios = self.update_model(model_type, state)
+        else:
+            model, topic_words, topic_ratios = self.fit_model(model_type)
+
+        # create topic_ratio_df for topic ratio table
+        topic_ratios_df = self.create_topic_ratios_df(topic_ratios)
+
+        # save as csv
+        topic_words_filename = self.save_topic_words(topic_words, model_type)
+        topic_ratios_filename = self.save_topic_ratios(topic_ratios_df, model_type)
+
+        # print top words per topic
+        print(f'topic words ({model_type}):')
+        for idx, topic_str in enumerate([' '.join(a_topic) for a_topic in topic_words]):
+            print(f'#{idx}: {topic_str}')
+
+        # save visualization
+        visualization_filename = self.save_visualization(model, model_type, topic_ratios)
+        print(f'visualization saved')
+
+        model_result = {
+            'model': model,
+            'topic_words': topic_words,
+            # rows in the order of data_df (see JobResult for the table)
+            'topic_ratios': topic_ratios,
+            'topic_words_filename': topic_words_filename,
+            'topic_ratios_filename': topic_ratios_filename,
+            'visualization_filename': visualization_filename,
+        }
+        return model_result, topic_ratios
+
+    def load_data(self, db_client):
+        # keep article metadata only with the hashes stored on insert (contents are not read),
+        # contents are streamed by iter_corpus() if needed
+        sql_query, params = db_client.filter_by_keywords(self.sql_query, self.filter_keywords)
+        chunks = list(db_client.iter_metadata(sql_query, cfg.chunk_size, params=params))
+        if not chunks:
+            raise ValueError('No articles found for the SQL query.')
+        self.data_df = pd.concat(chunks, ignore_index=True)
+        print(f'n_samples:{len(self.data_df)}')
+
+    def sweep(self, n_components_list, db_client=None):
+        # compare numbers of topics, vectorizing only once
 
         # initialize db
         if db_client is None:
             db_client = DatabaseClient(cfg.db_filepath)
 
-        # load dataset
-        self.data_df = db_client.load_dataset(sql_query=self.sql_query)
-        print(f'n_samples:{len(self.data_df)}')
+        # load, tokenize and vectorize dataset (on the same snapshot of db)
+        with db_client.snapshot():
+            self.load_data(db_client)
+            self.vectorize_dataset(db_client)
+
+        # fit all candidates in parallel processes
+        candidates = [(n_components, model_type) for n_components in n_components_list for model_type in ['nmf', 'lda']]
+        scores = {}
+        with ProcessPoolExecutor(max_workers=max(cfg.model_workers, 1)) as executor:
+            futures = {executor.submit(_call_with_budget, cfg.blas_threads, self.score_model, model_type, n_components):
+                       (n_components, model_type) for n_components, model_type in candidates}
+            for future in as_completed(futures):
+                n_components, model_type = futures[future]
+                scores[(n_components, model_type)] = future.result()
+                print(f'scored: n_components={n_components} ({model_type})')
+
+        # one row per number of topics
+        df = pd.DataFrame([
+            {
+                'n_components': n_components,
+                'nmf_reconstruction_error': scores[(n_components, 'nmf')]['reconstruction_error'],
+                'nmf_coherence': scores[(n_components, 'nmf')]['coherence'],
+                'lda_perplexity': scores[(n_components, 'lda')]['perplexity'],
+                'lda_coherence': scores[(n_components, 'lda')]['coherence'],
+            } for n_components in n_components_list
+        ])
+        df.to_csv(os.path.join('data', 'topic_count_sweep.csv'), index=False)
+        print(df.to_string(index=False))
+
+        return df
+
+    def run(self, db_client=None, on_progress=None):
+        # on_progress: called with the percentage of models done
 
-        # vectorize data
-        self.vectorize(self.data_df['content'])
+        # initialize db
+        if db_client is None:
+            db_client = DatabaseClient(cfg.db_filepath)
+
+        result_cache = ResultCache(cfg.result_cache_dir,
+                                   max_entries=cfg.result_cache_size,
+                                   max_bytes=cfg.result_cache_mb*1024*1024)
+
+        # articles are read twice (metadata, then contents), on the same snapshot of db
+        with db_client.snapshot():
+            # load dataset
+            self.load_data(db_client)
+
+            # return the cached result if the same analysis was run on the same articles
+            result_key = self.fingerprint(self.data_df)
+            result = result_cache.get(result_key, get_filepath=self._get_output_filepath)
+            if result is not None:
+                print(f'result loaded from cache ({result_key})')
+                # output files were restored into the output directory of this run
+                for model_result in result['models'].values():
+                    for name, root_dir in OUTPUT_ROOT_DIRS.items():
+                        model_result[name] = self._get_output_filename(os.path.basename(model_result[name]), root_dir)
+                return result
+
+            # update previous models with new articles if possible
+            state = self.load_model_state() if cfg.incremental_analysis else None
+            incremental = state is not None and self.vectorize_incremental(state, db_client)
+            if incremental:
+                oov_rate = state['oov_rate']
+            else:
+                self.vectorize_dataset(db_client)
+                oov_rate = self._get_oov_rate(self.tf, self.n_tokens)
+        print(f"{'updating' if incremental else 'fitting'} models")
 
         # initialize result
         result = {
@@ -177,33 +633,37 @@ class Analyzer:
         result['top_words'] = self.get_top_words()
         print(f"top words:\n{result['top_words']}")
 
-        for model_type in result['models'].keys():
+        models_topic_ratios = {}
 
-            # fit model
-            model, topic_words, topic_ratios = self.fit_model(model_type)
+        # fit models, in parallel processes if configured
+        model_types = list(result['models'].keys())
+        model_state = state if incremental else None
+        if cfg.model_workers > 1:
+            with ProcessPoolExecutor(max_workers=min(cfg.model_workers, len(model_types))) as executor:
+                futures = {executor.submit(_call_with_budget, cfg.blas_threads, self.run_model, model_type, model_state): model_type
+                           for model_type in model_types}
+                for i, future in enumerate(as_completed(futures)):
+                    model_type = futures[future]
+                    result['models'][model_type], models_topic_ratios[model_type] = future.result()
+                    if on_progress is not None:
+                        on_progress(round((i+1)/len(model_types)*100, 1))
+        else:
+            for i, model_type in enumerate(model_types):
+                result['models'][model_type], models_topic_ratios[model_type] = \
+                    _call_with_budget(cfg.blas_threads, self.run_model, model_type, model_state)
+                if on_progress is not None:
+                    on_progress(round((i+1)/len(model_types)*100, 1))
+        models = {model_type: model_result['model'] for model_type, model_result in result['models'].items()}
+
+        # keep models for the next incremental run
+        if cfg.incremental_analysis:
+            self.save_model_state(models, models_topic_ratios, oov_rate)
 
-            # create topic_ratio_df for topic ratio table
-            topic_ratios_df = self.create_topic_ratios_df(topic_ratios)
-
-            # save as csv
-            topic_words_filename = self.save_topic_words(topic_words, model_type)
-            topic_ratios_filename = self.save_topic_ratios(topic_ratios_df, model_type)
-
-            # print top words per topic
-            print(f'topic words ({model_type}):')
-            for idx, topic_str in enumerate([' '.join(a_topic) for a_topic in topic_words]):
-                print(f'#{idx}: {topic_str}')
-
-            # save visualization
-            visualization_filename = self.save_visualization(model, model_type)
-            print(f'visualization saved')
-
-            # update result
-            result['models'][model_type]['model'] = model
-            result['models'][model_type]['topic_words'] = topic_words
-            result['models'][model_type]['topic_ratios'] = topic_ratios_df.to_dict(orient='records')
-            result['models'][model_type]['topic_words_filename'] = topic_words_filename
-            result['models'][model_type]['topic_ratios_filename'] = topic_ratios_filename
-            result['models'][model_type]['visualization_filename'] = visualization_filename
+        # cache result with the output files
+        output_filepaths = []
+        for model_result in result['models'].values():
+            for name, root_dir in OUTPUT_ROOT_DIRS.items():
+                output_filepaths.append(os.path.join(root_dir, model_result[name]))
+        result_cache.put(result_key, result, output_filepaths)
 
         return result
@@ -1,16 +1,17 @@
 import os
 import re
-import random
-import requests
+import itertools
 import traceback
-from time import sleep
-from bs4 import BeautifulSoup
-from fake_useragent import UserAgent
+
+import requests
 
 from library.constants import *
 from library.config import Config
 from library.db import DatabaseClient
-from library.utils import get_urls_from_search
+from library.crawler import AsyncCrawler
+from library.extractor import parse_article_page
+from library.session import get_session, get_timeout, get_random_user_agent
+from library.utils import iter_urls_from_search
 
 # read config
 cfg = Config()
@@ -34,17 +35,27 @@ class Bot:
         # join them all and return
         return ''.join(p_list)
 
+    @staticmethod
+    def _get_link(url):
+        # url without query string, as stored in DB
+        return url.split('?')[0]
+
     def _crawl_page(self, url):
         # get article page
-        headers = {'User-Agent': UserAgent().random}
-        result = requests.get(url,headers=headers)
+        headers = {'User-Agent': get_random_user_agent()}
+        try:
+            result = get_session().get(url, headers=headers, timeout=get_timeout())
+        except requests.exceptions.RequestException as err:
+            # timed out or connection error, counted as a failed page
+            print(f'request failed: {err}')
+            return None
 
         # skip to next article if failed
         if result.status_code != 200:
             return None
 
-        # parse page
-        soup = BeautifulSoup(result.content, features='html.parser')
+        # parse needed parts of page
+        soup = parse_article_page(result.content)
 
         # store information of article
         # NOTE: key must be initialized in the same order as the headers in DB
@@ -53,7 +64,7 @@ class Bot:
             # title
             article['title'] = soup.find('h1', 'cmn-article_title').find('span', 'JSID_key_fonthln').text.strip()
             # url
-            article['link'] = url.split('?')[0]
+            article['link'] = self._get_link(url)
             # date
             article['date'] = soup.find('dl', 'cmn-article_status').find('dd', 'cmnc-publish').text.strip()
             # industry
@@ -75,45 +86,101 @@ class Bot:
 
         return article
 
+    def _iter_new_urls(self, urls, db_client, batch_size=30):
+        # skip duplicated links and, if incremental, links already stored (one bulk lookup per batch)
+        seen_links = set()
+        urls = iter(urls)
+        while True:
+            batch = list(itertools.islice(urls, batch_size))
+            if not batch:
+                break
+            self.n_found += len(batch)
+            if cfg.incremental_crawl:
+                existing_links = db_client.get_existing_links({self._get_link(url) for url in batch})
+            else:
+                existing_links = set()
+            for url in batch:
+                link = self._get_link(url)
+                if link in existing_links or link in seen_links:
+                    continue
+                seen_links.add(link)
+                self.n_urls += 1
+                yield url
+        self.discovered = True
+
+    def _set_n_expected(self, n_items):
+        self.n_expected = n_items
+
+    def _get_progress(self, n_done):
+        # urls are still discovered while crawling, so the total is estimated until discovery finishes:
+        # urls to crawl so far + urls not found yet (known from the search)
+        if self.discovered:
+            n_total = self.n_urls
+        elif self.n_expected is not None:
+            n_total = self.n_urls + max(self.n_expected - self.n_found, 0)
+        else:
+            n_total = None
+        if cfg.max_article:
+            n_total = min(n_total, cfg.max_article) if n_total else cfg.max_article
+        if not n_total:
+            # unknown total, keep the last progress
+            return self.progress
+
+        progress = round(n_done/n_total*100, 1)
+        if not self.discovered and not cfg.max_article:
+            # 100% only once all urls are known
+            progress = min(progress, 99.9)
+        # never goes back (ex. when more urls are found than expected)
+        return max(progress, self.progress)
+
     def run(self, urls=None, db_client=None):
 
         if db_client is None:
             # initialize db
             db_client = DatabaseClient(cfg.db_filepath)
 
+        # number of urls found / to crawl so far, and expected to be found (if known)
+        self.n_found = 0
+        self.n_urls = 0
+        self.n_expected = None
+        self.discovered = False
+        self.progress = 0
+
         if urls is None:
-            # get urls
-            urls = get_urls_from_search(keyword=self.keyword, industry=self.industry)
+            # stream urls from search so that crawling starts before the search finishes
+            urls = iter_urls_from_search(keyword=self.keyword, industry=self.industry,
+                                         on_n_items=self._set_n_expected)
 
-        if len(urls) == 0:
-            raise Exception('Urls not found')
+        urls = self._iter_new_urls(urls, db_client)
 
-        for i, url in enumerate(urls):
+        # limit to max_article
+        if cfg.max_article:
+            urls = itertools.islice(urls, cfg.max_article)
 
-            # break if exceeding max_article
-            if cfg.max_article and i >= cfg.max_article:
-                break
+        # crawl articles concurrently within the per-host rate limit
+        crawler = AsyncCrawler(fetch=self._crawl_page, max_concurrency=cfg.max_concurrency)
 
-            # set random request interval 0.5s~2s
-            sleep(round(random.uniform(0.5, 2), 1))
+        try:
+            for i, (url, article) in enumerate(crawler.iterate(urls)):
 
-            # crawl article
-            article = self._crawl_page(url)
+                # skip to next article if failed
+                if article is None:
+                    print(f"fail: {i+1}/{self.n_urls} ({url})")
+                    continue
 
-            # skip to next article if failed
-            if article is None:
-                print(f"fail: {i+1}/{len(urls)} ({url})")
-                continue
+                # insert a record
+                db_client.insert_record(article)
 
-            # insert a record
-            db_client.insert_record(article)
+                print(f"done: {i+1}/{self.n_urls} ({article['title']})")
 
-            print(f"done: {i+1}/{len(urls)} ({article['title']})")
+                # calculate current progress
+                self.progress = self._get_progress(i+1)
 
-            # calculate current progress
-            if cfg.max_article:
-                self.progress = round((i+1)/cfg.max_article*100, 1)
-            else:
-                self.progress = round((i+1)/len(urls)*100, 1)
+                yield self.progress
+        finally:
+            # commit buffered records
+            db_client.flush()
 
-            yield self.progress
+        if self.n_found == 0:
+            raise Exception('Urls not found')
+        print(f'new items: {self.n_urls}')
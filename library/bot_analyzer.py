@@ -6,19 +6,21 @@ from library.config import Config
 from library.bot import Bot
 from library.analyzer import Analyzer
 from library.db import DatabaseClient
-from library.utils import get_urls_from_search
+from library.job_result import JobResult, get_result_dir
 
 # read config
 cfg = Config()
 
 
-class BotAnalyzer(threading.Thread):
-    def __init__(self, **kwargs):
-        super().__init__()
+class BotAnalyzer:
+    def __init__(self, output_dir='', **kwargs):
         # params used in threading/responding
         self.progress = 0
         self.status = BotAnalyzerStatus.IDLE
         self._stopper = threading.Event()
+        # sub directory for output files (see Analyzer), the result is saved in it too (see JobResult)
+        self.output_dir = output_dir
+        self.result_dir = get_result_dir(output_dir)
         # get and validate params
         self._get_params(**kwargs)
         # initialize db
@@ -31,6 +33,7 @@ class BotAnalyzer(threading.Thread):
             'keyword': str,
             'industry': int,
             'sql_query': str,
+            'filter_keywords': list,
             'n_components': int,
             'n_features': int,
             'stop_words': list,
@@ -56,9 +59,11 @@ class BotAnalyzer(threading.Thread):
         except KeyError as err_key:
             raise KeyError(f'invalid param: "{err_key}"')
 
-        # check if all params are assigned
-        for name in params.keys():
-            val = getattr(self, name)
+        # check if all params are assigned (list params are empty if not specified)
+        for name, param_type in params.items():
+            if param_type is list and not hasattr(self, name):
+                setattr(self, name, [])
+            val = getattr(self, name, None)
             assert val is not None, f'param not found: "{name}"'
 
         # check ranges of numeric params
@@ -79,7 +84,14 @@ class BotAnalyzer(threading.Thread):
     def _validate_sql_query(self):
         if not self.sql_query:
             raise ValueError(f'Please enter an SQL query.')
-        self.db_client.load_dataset(self.sql_query)
+        columns = self.db_client.validate_query(*self.db_client.filter_by_keywords(self.sql_query,
+                                                                                  self.filter_keywords))
+        missing = [column for column in ['id', 'title', 'link', 'content'] if column not in columns]
+        if missing:
+            raise ValueError(f'SQL query must select column(s): {", ".join(missing)}')
+
+    def _update_progress(self, progress):
+        self.progress = progress
 
     def stop(self):
         # reset
@@ -88,44 +100,77 @@ class BotAnalyzer(threading.Thread):
         # set event
         self._stopper.set()
 
-    def run(self):
+    @property
+    def stopped(self):
+        return self._stopper.isSet()
+
+    @property
+    def needs_crawl(self):
+        # skip running bot if not specified
+        return all([self.keyword, self.industry])
+
+    def set_error(self, err, tb=None):
+        self.error = err
+        self.traceback = traceback.format_exc() if tb is None else tb
+        self.status = BotAnalyzerStatus.ERROR
+
+    def crawl(self, is_stopped=None):
+        # run bot (urls are searched while crawling), errors are raised, returns whether it ran to the end
+        # is_stopped: when to stop crawling, by default once this job is stopped (see JobManager for shared crawls)
+        if is_stopped is None:
+            is_stopped = lambda: self.stopped
+        if is_stopped():
+            return False
+        self.status = BotAnalyzerStatus.CRAWLING
+        self.progress = 0
+        bot = Bot(keyword=self.keyword, industry=self.industry)
+        for progress in bot.run(db_client=self.db_client):
+            self.progress = progress
+            if is_stopped():
+                return False
+        return True
+
+    def analyze(self):
+        # run analyzer, errors are kept in self.error
+        if self.stopped:
+            return
         try:
-            # run initialization
-            self.status = BotAnalyzerStatus.INITIALIZING
-
-            # get urls
-            if all([self.keyword, self.industry]):
-                urls = get_urls_from_search(keyword=self.keyword, industry=self.industry)
-            else:
-                # skip running bot
-                urls = None
-            if self._stopper.isSet():
-                return
-
-            if urls is not None:
-                # run bot
-                self.status = BotAnalyzerStatus.CRAWLING
-                bot = Bot(keyword=self.keyword, industry=self.industry)
-                for progress in bot.run(urls, self.db_client):
-                    self.progress = progress
-                    if self._stopper.isSet():
-                        return
-
-            # run analyzer
             self.status = BotAnalyzerStatus.ANALYZING
+            self.progress = 0
             analyzer = Analyzer(sql_query=self.sql_query,
                                 n_components=self.n_components,
                                 n_features=self.n_features,
                                 stop_words=self.stop_words,
                                 n_top_words=self.n_top_words,
-                                n_topic_words=self.n_topic_words)
-            result = analyzer.run(self.db_client)
+                                n_topic_words=self.n_topic_words,
+                                filter_keywords=self.filter_keywords,
+                                output_dir=self.output_dir)
+            result = analyzer.run(self.db_client, on_progress=self._update_progress)
+            if self.stopped:
+                return
+            # keep the result on disk only
+            JobResult.save(self.result_dir, result, analyzer.data_df)
 
         except Exception as err:
-            self.error = err
-            self.traceback = traceback.format_exc()
-            self.status = BotAnalyzerStatus.ERROR
+            self.set_error(err)
 
         else:
-            self.result = result
             self.status = BotAnalyzerStatus.COMPLETE
+
+    def run(self):
+        # crawl and analyze in the calling thread (see JobManager to run them in worker pools)
+        # run initialization
+        self.status = BotAnalyzerStatus.INITIALIZING
+        if self.stopped:
+            return
+
+        if self.needs_crawl:
+            try:
+                self.crawl()
+            except Exception as err:
+                self.set_error(err)
+                return
+            if self.stopped:
+                return
+
+        self.analyze()
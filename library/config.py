@@ -41,10 +41,46 @@ class Config:
     def csv_filepath(self) -> str:
         return self.parser.get('bot', 'csv_filepath')
 
+    @property
+    def incremental_crawl(self) -> bool:
+        return self.parser.getboolean('bot', 'incremental_crawl', fallback=True)
+
+    @property
+    def max_concurrency(self) -> int:
+        return self.parser.getint('bot', 'max_concurrency', fallback=4)
+
+    @property
+    def crawl_workers(self) -> int:
+        return self.parser.getint('bot', 'crawl_workers', fallback=1)
+
+    @property
+    def rate_limit(self) -> float:
+        return self.parser.getfloat('bot', 'rate_limit', fallback=1.0)
+
+    @property
+    def rate_burst(self) -> int:
+        return self.parser.getint('bot', 'rate_burst', fallback=1)
+
+    @property
+    def http_pool_size(self) -> int:
+        return self.parser.getint('bot', 'http_pool_size', fallback=8)
+
+    @property
+    def connect_timeout(self) -> float:
+        return self.parser.getfloat('bot', 'connect_timeout', fallback=5.0)
+
+    @property
+    def read_timeout(self) -> float:
+        return self.parser.getfloat('bot', 'read_timeout', fallback=30.0)
+
     @property
     def sql_query(self) -> str:
         return self.parser.get('analyzer', 'sql_query')
 
+    @property
+    def filter_keywords(self) -> str:
+        return self.parser.get('analyzer', 'filter_keywords', fallback='')
+
     @property
     def n_components(self) -> int:
         return self.parser.getint('analyzer', 'n_components')
@@ -65,10 +101,106 @@ class Config:
     def n_topic_words(self) -> int:
         return self.parser.getint('analyzer', 'n_topic_words')
 
+    @property
+    def tokenizer_processes(self) -> int:
+        return self.parser.getint('analyzer', 'tokenizer_processes', fallback=1)
+
+    @property
+    def chunk_size(self) -> int:
+        return self.parser.getint('analyzer', 'chunk_size', fallback=1000)
+
+    @property
+    def vectorizer(self) -> str:
+        return self.parser.get('analyzer', 'vectorizer', fallback='count')
+
+    @property
+    def hashing_n_features(self) -> int:
+        return self.parser.getint('analyzer', 'hashing_n_features', fallback=2**20)
+
+    @property
+    def vectorizer_processes(self) -> int:
+        return self.parser.getint('analyzer', 'vectorizer_processes', fallback=1)
+
+    @property
+    def analysis_workers(self) -> int:
+        return self.parser.getint('analyzer', 'analysis_workers', fallback=2)
+
+    @property
+    def model_workers(self) -> int:
+        return self.parser.getint('analyzer', 'model_workers', fallback=1)
+
+    @property
+    def blas_threads(self) -> int:
+        return self.parser.getint('analyzer', 'blas_threads', fallback=0)
+
+    @property
+    def vis_max_samples(self) -> int:
+        return self.parser.getint('analyzer', 'vis_max_samples', fallback=5000)
+
+    @property
+    def ldavis_mode(self) -> str:
+        return self.parser.get('analyzer', 'ldavis_mode', fallback='full')
+
+    @property
+    def ldavis_n_jobs(self) -> int:
+        return self.parser.getint('analyzer', 'ldavis_n_jobs', fallback=-1)
+
+    @property
+    def dtm_store_dir(self) -> str:
+        return os.path.join('./data', 'dtm')
+
+    @property
+    def ldavis_cache_dir(self) -> str:
+        return os.path.join('./data', 'cache', 'ldavis')
+
+    @property
+    def incremental_analysis(self) -> bool:
+        return self.parser.getboolean('analyzer', 'incremental', fallback=False)
+
+    @property
+    def refit_threshold(self) -> float:
+        return self.parser.getfloat('analyzer', 'refit_threshold', fallback=0.1)
+
+    @property
+    def incremental_max_iter(self) -> int:
+        return self.parser.getint('analyzer', 'incremental_max_iter', fallback=20)
+
+    @property
+    def model_state_dir(self) -> str:
+        return os.path.join('./data', 'cache', 'models')
+
+    @property
+    def result_cache_size(self) -> int:
+        return self.parser.getint('analyzer', 'result_cache_size', fallback=20)
+
+    @property
+    def result_cache_mb(self) -> int:
+        return self.parser.getint('analyzer', 'result_cache_mb', fallback=500)
+
+    @property
+    def result_cache_dir(self) -> str:
+        return os.path.join('./data', 'cache', 'results')
+
+    @property
+    def max_jobs(self) -> int:
+        return self.parser.getint('developer', 'max_jobs', fallback=50)
+
+    @property
+    def table_page_size(self) -> int:
+        return self.parser.getint('developer', 'table_page_size', fallback=50)
+
+    @property
+    def table_count_limit(self) -> int:
+        return self.parser.getint('developer', 'table_count_limit', fallback=10000)
+
     @property
     def db_filepath(self) -> str:
         return os.path.join('./data', self.parser.get('developer', 'db_filename'))
 
+    @property
+    def db_batch_size(self) -> int:
+        return self.parser.getint('developer', 'db_batch_size', fallback=50)
+
     @property
     def max_article(self) -> int:
         return self.parser.getint('developer', 'max_article')
@@ -21,6 +21,7 @@ INPUT_VAL_DESCRIPTION = {
     'keyword':'検索ワードを指定',
     'industry':'絞り込みたい産業を指定',
     'sql_query':'分析対象にする記事を指定',
+    'filter_keywords':'指定した語をすべて含む記事のみ分析（カンマ区切り）',
     'stop_words':'分析の対象外とする語を指定',
     'n_components':'いくつのトピックに分けるか指定',
     'n_features':'出現頻度上位何語で分析するか指定',
@@ -31,9 +32,18 @@ INPUT_VAL_DESCRIPTION = {
 
 class BotAnalyzerStatus:
     IDLE = 'IDLE'
+    QUEUED = 'QUEUED'
     INITIALIZING = 'INITIALIZING'
     CRAWLING = 'CRAWLING'
     ANALYZING = 'ANALYZING'
-    PROCESSING = [INITIALIZING, CRAWLING, ANALYZING]
+    PROCESSING = [QUEUED, INITIALIZING, CRAWLING, ANALYZING]
     COMPLETE = 'COMPLETE'
     ERROR = 'ERROR'
+
+
+# part-of-speech rules used when tokenizing articles (MeCab ipadic features)
+TOKENIZER_POS_RULES = {
+    'pos': '名詞',
+    'excluded_pos_detail1': ['数', '非自立', '接続詞的', '接尾', '代名詞'],
+    'excluded_pos_detail2': ['組織', '人名'],
+}
@@ -0,0 +1,126 @@
+import time
+import asyncio
+import threading
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+
+from library.config import Config
+
+# read config
+cfg = Config()
+
+
+class TokenBucket:
+    def __init__(self, rate, capacity):
+        # rate: tokens per second (0 for unlimited)
+        self.rate = rate
+        self.capacity = max(capacity, 1)
+        self._tokens = self.capacity
+        self._updated_at = time.monotonic()
+        # shared by threads and event loops
+        self._lock = threading.Lock()
+
+    def _reserve(self):
+        # take a token and return how long to wait until it is available
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+            self._updated_at = now
+            self._tokens -= 1
+            return max(0.0, -self._tokens / self.rate)
+
+    async def acquire(self):
+        if self.rate > 0:
+            await asyncio.sleep(self._reserve())
+
+    def acquire_blocking(self):
+        if self.rate > 0:
+            time.sleep(self._reserve())
+
+
+# one rate limiter per host, shared by url search and article crawling
+_host_buckets = {}
+_host_buckets_lock = threading.Lock()
+
+
+def get_host_bucket(url):
+    host = urllib.parse.urlsplit(url).netloc
+    with _host_buckets_lock:
+        if host not in _host_buckets:
+            _host_buckets[host] = TokenBucket(cfg.rate_limit, cfg.rate_burst)
+        return _host_buckets[host]
+
+
+class AsyncCrawler:
+    def __init__(self, fetch, max_concurrency):
+        # fetch: blocking function which takes a url, run in worker threads
+        self.fetch = fetch
+        self.max_concurrency = max(max_concurrency, 1)
+
+    async def _crawl_one(self, executor, semaphore, url):
+        async with semaphore:
+            await get_host_bucket(url).acquire()
+            result = await asyncio.get_event_loop().run_in_executor(executor, self.fetch, url)
+        return url, result
+
+    async def crawl(self, urls):
+        # yields (url, result) in order of completion
+        # urls may be a blocking iterator (ex. streamed from search), it is read in a separate thread
+        # NOTE: asyncio primitives are created here to bind them to the running loop
+        loop = asyncio.get_event_loop()
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        done_tasks = asyncio.Queue()
+        tasks = []
+
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as executor, \
+                ThreadPoolExecutor(max_workers=1) as feed_executor:
+
+            async def feed():
+                url_iter = iter(urls)
+                while True:
+                    url = await loop.run_in_executor(feed_executor, next, url_iter, None)
+                    if url is None:
+                        break
+                    task = asyncio.ensure_future(self._crawl_one(executor, semaphore, url))
+                    task.add_done_callback(done_tasks.put_nowait)
+                    tasks.append(task)
+
+            feeder = asyncio.ensure_future(feed())
+            n_yielded = 0
+            try:
+                while True:
+                    if feeder.done():
+                        # raise errors while reading urls
+                        feeder.result()
+                        if n_yielded == len(tasks):
+                            break
+                        task = await done_tasks.get()
+                    else:
+                        getter = asyncio.ensure_future(done_tasks.get())
+                        await asyncio.wait([getter, feeder], return_when=asyncio.FIRST_COMPLETED)
+                        if not getter.done():
+                            getter.cancel()
+                            continue
+                        task = getter.result()
+                    n_yielded += 1
+                    yield task.result()
+            finally:
+                # cancel pending requests if stopped halfway
+                feeder.cancel()
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(feeder, *tasks, return_exceptions=True)
+
+    def iterate(self, urls):
+        # run crawl() on a private event loop behind a plain generator
+        loop = asyncio.new_event_loop()
+        agen = self.crawl(urls)
+        try:
+            while True:
+                try:
+                    yield loop.run_until_complete(agen.__anext__())
+                except StopAsyncIteration:
+                    break
+        finally:
+            loop.run_until_complete(agen.aclose())
+            loop.close()
@@ -1,15 +1,94 @@
+import re
+import json
 import sqlite3
+import hashlib
+import contextlib
+import threading
 import pandas as pd
 
+from library.constants import *
+from library.config import Config
+
+# read config
+cfg = Config()
+
+# bump when existing rows must be migrated (see _create_table)
+SCHEMA_VERSION = 2
+
+# ex. 2019/11/15 15:00, 2019年11月15日
+DATE_PATTERN = re.compile(r'(\d{4})\s*[/年.-]\s*(\d{1,2})\s*[/月.-]\s*(\d{1,2})')
+INDUSTRY_CODES = {industry: code for code, industry in INDUSTRY_OPTIONS.items() if code != 0}
+
+
+def parse_date(date):
+    # scraped display date to a sortable YYYY-MM-DD (None if unknown)
+    match = DATE_PATTERN.search(date or '')
+    if match is None:
+        return None
+    year, month, day = (int(v) for v in match.groups())
+    return f'{year:04d}-{month:02d}-{day:02d}'
+
+
+def get_industry_code(industry):
+    # key of INDUSTRY_OPTIONS (None for other categories)
+    return INDUSTRY_CODES.get((industry or '').strip())
+
+
+def content_hash(text):
+    return hashlib.sha1(str(text).encode('utf-8')).hexdigest()
+
 
 class DatabaseClient:
-    def __init__(self, db_filepath):
+    def __init__(self, db_filepath, batch_size=None):
         self.db_filepath = db_filepath
+        # number of buffered records committed at once by insert_record()
+        self.batch_size = cfg.db_batch_size if batch_size is None else batch_size
+        self._buffer = []
+        self._buffer_lock = threading.Lock()
+        self._local = threading.local()
         # create articles table
         self._create_table()
 
+    @property
+    def conn(self):
+        # one long-lived connection per thread (sqlite3 connections can't be shared across threads)
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_filepath, timeout=30)
+            # WAL lets readers (ex. flask routes) proceed while the bot is writing
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    @property
+    def read_conn(self):
+        # connection used for reading datasets, see snapshot()
+        return getattr(self._local, 'snapshot_conn', None) or self.conn
+
+    @contextlib.contextmanager
+    def snapshot(self):
+        # datasets read in this block (in the current thread) see the same state of db,
+        # even if the bot inserts articles meanwhile (WAL keeps writers unblocked)
+        conn = sqlite3.connect(self.db_filepath, timeout=30, isolation_level=None)
+        conn.execute('BEGIN')
+        self._local.snapshot_conn = conn
+        try:
+            yield
+        finally:
+            self._local.snapshot_conn = None
+            conn.close()
+
+    def close(self):
+        # flush and close the connection of the current thread
+        self.flush()
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
     def _create_table(self):
-        with sqlite3.connect(self.db_filepath) as conn:
+        with self.conn as conn:
             c = conn.cursor()
             c.execute('''
                       CREATE TABLE IF NOT EXISTS articles
@@ -18,17 +97,261 @@ class DatabaseClient:
                        link TEXT NOT NULL,
                        date TEXT,
                        industry TEXT,
-                       content TEXT NOT NULL)
+                       content TEXT NOT NULL,
+                       published_at TEXT,
+                       industry_code INTEGER,
+                       content_hash TEXT)
                       ''')
-            conn.commit()
+            # columns derived from date, industry and content (tables created before them are migrated)
+            c.execute('PRAGMA table_info(articles)')
+            columns = [row[1] for row in c.fetchall()]
+            for column, column_type in [('published_at', 'TEXT'), ('industry_code', 'INTEGER'), ('content_hash', 'TEXT')]:
+                if column not in columns:
+                    c.execute(f'ALTER TABLE articles ADD COLUMN {column} {column_type}')
+            # contents updated by hand lose their hash (hashed again on read, see iter_metadata)
+            c.execute('''
+                      CREATE TRIGGER IF NOT EXISTS articles_content_hash_reset AFTER UPDATE OF content ON articles
+                      WHEN new.content IS NOT old.content AND new.content_hash IS old.content_hash BEGIN
+                       UPDATE articles SET content_hash = NULL WHERE id = new.id;
+                      END
+                      ''')
+            # one record per link (remove duplicates stored before the index existed)
+            c.execute("SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = 'idx_articles_link'")
+            if c.fetchone() is None:
+                c.execute('DELETE FROM articles WHERE id NOT IN (SELECT MIN(id) FROM articles GROUP BY link)')
+                c.execute('CREATE UNIQUE INDEX idx_articles_link ON articles(link)')
+            # filtered nouns per article (stop words not applied)
+            c.execute('''
+                      CREATE TABLE IF NOT EXISTS tokens
+                      (article_id INTEGER NOT NULL,
+                       settings_hash TEXT NOT NULL,
+                       content_hash TEXT NOT NULL,
+                       tokens TEXT NOT NULL,
+                       PRIMARY KEY (article_id, settings_hash))
+                      ''')
+        # user_version is set once the derived columns are filled (resumed if interrupted)
+        if self.conn.execute('PRAGMA user_version').fetchone()[0] < SCHEMA_VERSION:
+            self._backfill_derived_columns()
+            self.conn.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+        with self.conn as conn:
+            # for filters on industry and date ranges
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_articles_published_at ON articles(published_at)')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_articles_industry_code ON articles(industry_code, published_at)')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_articles_industry ON articles(industry, published_at)')
+        # keyword search index, optional as sqlite may be built without FTS5
+        self.fts_enabled = self._create_fts_table()
 
-    def insert_record(self, article):
-        with sqlite3.connect(self.db_filepath) as conn:
+    def _backfill_derived_columns(self, batch_size=1000):
+        # one transaction per batch, keyed by id so that rows are read once
+        last_id = -1
+        n_rows = 0
+        while True:
+            rows = self.conn.execute('SELECT id, date, industry, content FROM articles WHERE id > ? ORDER BY id LIMIT ?',
+                                     (last_id, batch_size)).fetchall()
+            if not rows:
+                break
+            with self.conn as conn:
+                conn.executemany('UPDATE articles SET published_at = ?, industry_code = ?, content_hash = ? WHERE id = ?',
+                                 [(parse_date(date), get_industry_code(industry), content_hash(content), article_id)
+                                  for article_id, date, industry, content in rows])
+            last_id = rows[-1][0]
+            n_rows += len(rows)
+        print(f'articles migrated: {n_rows}')
+
+    def _create_fts_table(self):
+        with self.conn as conn:
             c = conn.cursor()
-            c.execute('INSERT INTO articles VALUES (NULL,?,?,?,?,?)', tuple(article.values()))
-            conn.commit()
+            c.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'articles_fts'")
+            if c.fetchone() is not None:
+                return True
+            try:
+                # trigram tokens match any substring of 3+ characters (no word segmentation needed for japanese)
+                c.execute('''
+                          CREATE VIRTUAL TABLE articles_fts USING fts5
+                          (title, content, content='articles', content_rowid='id', tokenize='trigram')
+                          ''')
+            except sqlite3.OperationalError as err:
+                print(f'full-text search disabled: {err}')
+                return False
+            # kept in sync with articles (upserts fire the update trigger)
+            c.execute('''
+                      CREATE TRIGGER articles_fts_insert AFTER INSERT ON articles BEGIN
+                       INSERT INTO articles_fts (rowid, title, content) VALUES (new.id, new.title, new.content);
+                      END
+                      ''')
+            c.execute('''
+                      CREATE TRIGGER articles_fts_delete AFTER DELETE ON articles BEGIN
+                       INSERT INTO articles_fts (articles_fts, rowid, title, content)
+                       VALUES ('delete', old.id, old.title, old.content);
+                      END
+                      ''')
+            c.execute('''
+                      CREATE TRIGGER articles_fts_update AFTER UPDATE OF title, content ON articles BEGIN
+                       INSERT INTO articles_fts (articles_fts, rowid, title, content)
+                       VALUES ('delete', old.id, old.title, old.content);
+                       INSERT INTO articles_fts (rowid, title, content) VALUES (new.id, new.title, new.content);
+                      END
+                      ''')
+            # index articles stored before
+            c.execute("INSERT INTO articles_fts (articles_fts) VALUES ('rebuild')")
+        return True
+
+    def insert_record(self, article):
+        # buffered, call flush() to commit the rest
+        with self._buffer_lock:
+            self._buffer.append(article)
+            if len(self._buffer) < self.batch_size:
+                return
+            articles, self._buffer = self._buffer, []
+        self.insert_many(articles)
+
+    def flush(self):
+        with self._buffer_lock:
+            articles, self._buffer = self._buffer, []
+        if articles:
+            self.insert_many(articles)
+
+    def insert_many(self, articles):
+        # upsert on the unique link, committed in one transaction
+        records = [dict(article,
+                        published_at=parse_date(article['date']),
+                        industry_code=get_industry_code(article['industry']),
+                        content_hash=content_hash(article['content'])) for article in articles]
+        with self.conn as conn:
+            conn.executemany('''
+                             INSERT INTO articles (title, link, date, industry, content, published_at, industry_code,
+                                                   content_hash)
+                             VALUES (:title, :link, :date, :industry, :content, :published_at, :industry_code,
+                                     :content_hash)
+                             ON CONFLICT(link) DO UPDATE SET
+                              title = excluded.title,
+                              date = excluded.date,
+                              industry = excluded.industry,
+                              content = excluded.content,
+                              published_at = excluded.published_at,
+                              industry_code = excluded.industry_code,
+                              content_hash = excluded.content_hash
+                             ''', records)
+
+    def get_existing_links(self, links, chunk_size=500):
+        existing = set()
+        links = list(links)
+        c = self.conn.cursor()
+        for i in range(0, len(links), chunk_size):
+            chunk = links[i:i+chunk_size]
+            placeholders = ','.join('?' * len(chunk))
+            c.execute(f'SELECT link FROM articles WHERE link IN ({placeholders})', chunk)
+            existing.update(row[0] for row in c.fetchall())
+        return existing
+
+    def filter_by_keywords(self, sql_query, keywords):
+        # narrows sql_query down to articles containing all keywords (in title or content),
+        # returns the query and its params
+        keywords = [keyword.strip() for keyword in keywords or [] if keyword.strip()]
+        if not keywords:
+            return sql_query, ()
+
+        conditions = []
+        params = []
+        # trigram index can only look up keywords of 3+ characters
+        fts_keywords = [keyword for keyword in keywords if self.fts_enabled and len(keyword) >= 3]
+        if fts_keywords:
+            conditions.append('id IN (SELECT rowid FROM articles_fts WHERE articles_fts MATCH ?)')
+            params.append(' AND '.join('"{}"'.format(keyword.replace('"', '""')) for keyword in fts_keywords))
+        # full scan for the others
+        for keyword in keywords:
+            if keyword not in fts_keywords:
+                conditions.append("(title LIKE ? ESCAPE '\\' OR content LIKE ? ESCAPE '\\')")
+                pattern = '%{}%'.format(keyword.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_'))
+                params.extend([pattern, pattern])
+
+        return f"SELECT * FROM ({sql_query.strip().rstrip(';')}) WHERE {' AND '.join(conditions)}", tuple(params)
+
+    def load_page(self, sql_query, params=(), limit=50, after_id=None, before_id=None, excluded_columns=('content',)):
+        # one page of rows ordered by id (keyset pagination, so deep pages cost the same),
+        # projected in sqlite to skip reading excluded columns
+        # returns the page and whether there are more rows in the paging direction
+        columns = [column for column in self.validate_query(sql_query, params) if column not in excluded_columns]
+        if 'id' not in columns:
+            raise ValueError('SQL query must select column(s): id')
+        projection = self._get_projection(columns)
+        sql_query = sql_query.strip().rstrip(';')
+
+        if before_id is not None:
+            # previous page, read backwards
+            page_query = f'SELECT {projection} FROM ({sql_query}) WHERE id < ? ORDER BY id DESC LIMIT ?'
+            page_params = (before_id, limit + 1)
+        elif after_id is not None:
+            page_query = f'SELECT {projection} FROM ({sql_query}) WHERE id > ? ORDER BY id LIMIT ?'
+            page_params = (after_id, limit + 1)
+        else:
+            page_query = f'SELECT {projection} FROM ({sql_query}) ORDER BY id LIMIT ?'
+            page_params = (limit + 1,)
+
+        df = pd.read_sql_query(page_query, self.read_conn, params=tuple(params) + page_params)
+        has_more = len(df) > limit
+        df = df.iloc[:limit]
+        if before_id is not None:
+            df = df.iloc[::-1].reset_index(drop=True)
+        return df, has_more
+
+    def count_rows(self, sql_query, params=(), max_count=10000):
+        # number of rows, counting stops after max_count (returns max_count+1 if there are more)
+        c = self.read_conn.execute(f"SELECT count(*) FROM (SELECT 1 FROM ({sql_query.strip().rstrip(';')}) LIMIT ?)",
+                                   tuple(params) + (max_count + 1,))
+        return c.fetchone()[0]
+
+    def load_dataset(self, sql_query, params=()):
+        return pd.read_sql_query(sql_query, self.read_conn, params=params)
+
+    def iter_dataset(self, sql_query, chunk_size, params=(), columns=None):
+        # yields dataframes of at most chunk_size rows, fetched from the cursor lazily
+        # columns: read these columns only (projected in sqlite)
+        if columns is not None:
+            sql_query = f"SELECT {self._get_projection(columns)} FROM ({sql_query.strip().rstrip(';')})"
+        return pd.read_sql_query(sql_query, self.read_conn, params=params, chunksize=chunk_size)
+
+    def iter_metadata(self, sql_query, chunk_size, params=()):
+        # yields dataframes of id, title, link and content_hash of at most chunk_size rows,
+        # contents are read (and hashed) only for rows without a stored hash (ex. queries not selecting it)
+        stored_hash = '"content_hash"' if 'content_hash' in self.validate_query(sql_query, params) else 'NULL'
+        sql_query = (f'SELECT id, title, link, {stored_hash} AS content_hash, '
+                     f'CASE WHEN {stored_hash} IS NULL THEN content END AS content '
+                     f"FROM ({sql_query.strip().rstrip(';')})")
+        for chunk_df in pd.read_sql_query(sql_query, self.read_conn, params=params, chunksize=chunk_size):
+            missing = chunk_df['content_hash'].isnull()
+            if missing.any():
+                chunk_df.loc[missing, 'content_hash'] = [content_hash(text) for text in chunk_df.loc[missing, 'content']]
+            yield chunk_df.drop(columns=['content'])
+
+    @staticmethod
+    def _get_projection(columns):
+        return ', '.join('"{}"'.format(column.replace('"', '""')) for column in columns)
+
+    def validate_query(self, sql_query, params=()):
+        # returns the column names of the query without reading any row
+        # (raises sqlite3 errors, including for statements other than SELECT)
+        c = self.conn.execute(f"SELECT * FROM ({sql_query.strip().rstrip(';')}) LIMIT 0", params)
+        return [column[0] for column in c.description]
+
+    def load_tokens(self, article_ids, settings_hash, chunk_size=500):
+        # returns {article_id: (content_hash, tokens)}
+        cached = {}
+        article_ids = [int(i) for i in article_ids]
+        c = self.conn.cursor()
+        for i in range(0, len(article_ids), chunk_size):
+            chunk = article_ids[i:i+chunk_size]
+            placeholders = ','.join('?' * len(chunk))
+            c.execute(f'SELECT article_id, content_hash, tokens FROM tokens '
+                      f'WHERE settings_hash = ? AND article_id IN ({placeholders})',
+                      [settings_hash] + chunk)
+            for article_id, content_hash, tokens in c.fetchall():
+                cached[article_id] = (content_hash, json.loads(tokens))
+        return cached
 
-    def load_dataset(self, sql_query):
-        with sqlite3.connect(self.db_filepath) as conn:
-            df = pd.read_sql_query(sql_query, conn)
-        return df
+    def save_tokens(self, records, settings_hash):
+        # records: [(article_id, content_hash, tokens), ...]
+        with self.conn as conn:
+            conn.executemany('INSERT OR REPLACE INTO tokens VALUES (?,?,?,?)',
+                             [(int(article_id), settings_hash, content_hash, json.dumps(tokens, ensure_ascii=False))
+                              for article_id, content_hash, tokens in records])
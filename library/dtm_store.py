@@ -0,0 +1,189 @@
+import os
+import json
+import shutil
+import threading
+from collections import Counter
+
+import numpy as np
+import scipy.sparse as sp
+
+# raw arrays appended in place and memory-mapped on read (rows are CSR, see get_matrix)
+ARRAY_DTYPES = {
+    'ids': np.int64,          # article id per row
+    'hashes': 'S40',          # content hash per row
+    'row_ends': np.int64,     # indptr without the leading 0
+    'indices': np.int32,      # column (vocabulary index) per nonzero
+    'data': np.int32,         # term count per nonzero
+}
+
+# appends and compactions are serialized per store directory
+_locks = {}
+_locks_lock = threading.Lock()
+
+
+def _get_lock(store_dir):
+    with _locks_lock:
+        return _locks.setdefault(os.path.abspath(store_dir), threading.Lock())
+
+
+class DtmStore:
+    def __init__(self, store_dir, settings_hash):
+        # term counts of all nouns (stop words included) per article, for a tokenizer setting
+        self.store_dir = store_dir
+        self.settings_hash = settings_hash
+        self._lock = _get_lock(store_dir)
+        with self._lock:
+            self._load()
+
+    def _filepath(self, name):
+        return os.path.join(self.store_dir, name)
+
+    def _load(self):
+        meta = None
+        if os.path.exists(self._filepath('meta.json')):
+            with open(self._filepath('meta.json'), encoding='utf-8') as f:
+                meta = json.load(f)
+        if meta is None or meta['settings_hash'] != self.settings_hash:
+            # rebuild from scratch for another tokenizer setting
+            shutil.rmtree(self.store_dir, ignore_errors=True)
+            os.makedirs(self.store_dir)
+            for name in ARRAY_DTYPES.keys():
+                open(self._filepath(f'{name}.bin'), 'wb').close()
+            meta = {'settings_hash': self.settings_hash, 'generation': 0, 'n_rows': 0, 'nnz': 0, 'n_vocabulary': 0}
+            self._write_json('vocabulary.json', [])
+            self._write_json('meta.json', meta)
+        self.meta = meta
+
+        with open(self._filepath('vocabulary.json'), encoding='utf-8') as f:
+            # append-only, entries beyond meta were written by an unfinished append
+            self.vocabulary = json.load(f)[:meta['n_vocabulary']]
+        self.word_index = {word: i for i, word in enumerate(self.vocabulary)}
+
+        # latest row of each article
+        ids = self._read_array('ids', meta['n_rows'])
+        self.row_index = dict(zip(ids.tolist(), range(meta['n_rows'])))
+        self.row_hashes = self._read_array('hashes', meta['n_rows'])
+
+    def _write_json(self, name, obj):
+        # replaced atomically, meta.json is written last to commit an append
+        with open(self._filepath(name + '.tmp'), mode='w', encoding='utf-8') as f:
+            json.dump(obj, f, ensure_ascii=False)
+        os.replace(self._filepath(name + '.tmp'), self._filepath(name))
+
+    def _read_array(self, name, length):
+        if length == 0:
+            return np.zeros(0, dtype=ARRAY_DTYPES[name])
+        return np.memmap(self._filepath(f'{name}.bin'), dtype=ARRAY_DTYPES[name], mode='r', shape=(length,))
+
+    def _write_array(self, name, values):
+        # replaced by rename, so memory maps of the previous file stay valid
+        values = np.asarray(values, dtype=ARRAY_DTYPES[name])
+        with open(self._filepath(f'{name}.bin.tmp'), 'wb') as f:
+            f.write(values.tobytes())
+        os.replace(self._filepath(f'{name}.bin.tmp'), self._filepath(f'{name}.bin'))
+
+    def _append_array(self, name, values, length):
+        # length: number of committed values, anything after it is dropped
+        values = np.asarray(values, dtype=ARRAY_DTYPES[name])
+        with open(self._filepath(f'{name}.bin'), 'r+b') as f:
+            f.truncate(length * values.itemsize)
+            f.seek(0, os.SEEK_END)
+            f.write(values.tobytes())
+
+    def get_missing(self, article_ids, content_hashes):
+        # ids of articles not stored yet or changed since, in the given order
+        missing = []
+        for article_id, text_hash in zip(article_ids, content_hashes):
+            row = self.row_index.get(article_id)
+            if row is None or self.row_hashes[row] != text_hash.encode('ascii'):
+                missing.append(article_id)
+        return missing
+
+    def append(self, records, batch_size=1000):
+        # records: iterable of (article_id, content_hash, nouns), committed every batch_size records
+        records = iter(records)
+        with self._lock:
+            # another instance may have appended meanwhile
+            self._load()
+            while True:
+                batch = [record for _, record in zip(range(batch_size), records)]
+                if not batch:
+                    break
+                self._append_batch(batch)
+            # drop rows replaced by newer ones if they take most of the store
+            if self.meta['n_rows'] > 2 * len(self.row_index) + batch_size:
+                self._compact()
+
+    def _append_batch(self, batch):
+        meta = dict(self.meta)
+        row_ends = []
+        indices = []
+        data = []
+        nnz = meta['nnz']
+        for _, _, nouns in batch:
+            counts = Counter(nouns)
+            for word in counts.keys():
+                if word not in self.word_index:
+                    self.word_index[word] = len(self.vocabulary)
+                    self.vocabulary.append(word)
+            # sorted column indices, like CountVectorizer
+            row = sorted((self.word_index[word], count) for word, count in counts.items())
+            indices.extend(column for column, _ in row)
+            data.extend(count for _, count in row)
+            nnz += len(row)
+            row_ends.append(nnz)
+
+        self._append_array('ids', [int(article_id) for article_id, _, _ in batch], meta['n_rows'])
+        self._append_array('hashes', [text_hash.encode('ascii') for _, text_hash, _ in batch], meta['n_rows'])
+        self._append_array('row_ends', row_ends, meta['n_rows'])
+        self._append_array('indices', indices, meta['nnz'])
+        self._append_array('data', data, meta['nnz'])
+        self._write_json('vocabulary.json', self.vocabulary)
+
+        meta['n_rows'] += len(batch)
+        meta['nnz'] = nnz
+        meta['n_vocabulary'] = len(self.vocabulary)
+        self._write_json('meta.json', meta)
+        self.meta = meta
+        for i, (article_id, _, _) in enumerate(batch):
+            self.row_index[int(article_id)] = meta['n_rows'] - len(batch) + i
+        self.row_hashes = self._read_array('hashes', meta['n_rows'])
+
+    def _compact(self):
+        article_ids = list(self.row_index.keys())
+        X = self._get_matrix(article_ids)
+        hashes = [self.row_hashes[self.row_index[article_id]] for article_id in article_ids]
+
+        self._write_array('ids', article_ids)
+        self._write_array('hashes', hashes)
+        self._write_array('row_ends', X.indptr[1:])
+        self._write_array('indices', X.indices)
+        self._write_array('data', X.data)
+        # row numbers changed, other instances reload before reading (see get_matrix)
+        self.meta = dict(self.meta, generation=self.meta['generation']+1, n_rows=len(article_ids), nnz=int(X.nnz))
+        self._write_json('meta.json', self.meta)
+        self._load()
+        print(f'dtm store compacted: {len(article_ids)} rows')
+
+    def get_matrix(self, article_ids):
+        # term count matrix of the given articles (in this order) over the whole vocabulary,
+        # only the rows asked for are read from the memory-mapped arrays
+        with self._lock:
+            # reload if appended or compacted by another instance
+            with open(self._filepath('meta.json'), encoding='utf-8') as f:
+                if json.load(f) != self.meta:
+                    self._load()
+            return self._get_matrix(article_ids)
+
+    def _get_matrix(self, article_ids):
+        meta = self.meta
+        rows = np.array([self.row_index[article_id] for article_id in article_ids], dtype=np.int64)
+        indptr = np.concatenate([[0], self._read_array('row_ends', meta['n_rows'])])
+        starts = indptr[rows]
+        lengths = indptr[rows + 1] - starts
+        new_indptr = np.concatenate([[0], np.cumsum(lengths)])
+        # positions of the selected rows' nonzeros in the stored arrays
+        positions = np.repeat(starts - new_indptr[:-1], lengths) + np.arange(new_indptr[-1])
+        indices = self._read_array('indices', meta['nnz'])[positions]
+        data = self._read_array('data', meta['nnz'])[positions]
+        return sp.csr_matrix((data, indices, new_indptr), shape=(len(rows), meta['n_vocabulary']))
@@ -0,0 +1,36 @@
+from bs4 import BeautifulSoup, SoupStrainer
+
+try:
+    # optional, much faster than html.parser
+    import lxml
+    HTML_PARSER = 'lxml'
+except ImportError:
+    HTML_PARSER = 'html.parser'
+
+# parts of an article page used by Bot._crawl_page, as (tag name, class)
+ARTICLE_PARTS = {
+    ('h1', 'cmn-article_title'),
+    ('dl', 'cmn-article_status'),
+    ('dd', 'm-pressRelease_Product_category_description'),
+    ('div', 'cmn-article_text'),
+}
+ARTICLE_PART_CLASSES = {c for _, c in ARTICLE_PARTS}
+
+
+def _has_article_part_class(classes):
+    # NOTE: called with the raw attribute while parsing, class is not split yet
+    # (a tag of another part with one of these classes is kept too, Bot._crawl_page finds by both)
+    if classes is None:
+        return False
+    if isinstance(classes, str):
+        classes = classes.split()
+    return any(c in ARTICLE_PART_CLASSES for c in classes)
+
+
+# matched the same way by old and new bs4 (a callable as name gets the tag name only in bs4>=4.13)
+ARTICLE_STRAINER = SoupStrainer(sorted({tag for tag, _ in ARTICLE_PARTS}), attrs={'class': _has_article_part_class})
+
+
+def parse_article_page(content):
+    # build the tree of the needed parts (and their descendants) only
+    return BeautifulSoup(content, features=HTML_PARSER, parse_only=ARTICLE_STRAINER)
@@ -0,0 +1,98 @@
+import os
+import json
+import uuid
+import pickle
+import shutil
+
+import numpy as np
+
+
+def get_result_dir(output_dir):
+    # result of a job is saved next to its output files under data/
+    return os.path.join('data', output_dir, 'result')
+
+
+class JobResult:
+    def __init__(self, result_dir):
+        # result saved by save(), only meta.json is read here and the other parts when accessed:
+        #   meta.json: top words, topic words and output filenames per model
+        #   ids.npy, articles.json: id, title and link per row of the topic ratios
+        #   <model_type>_topic_ratios.npy: topic ratios (float32, n_articles x n_topics)
+        #   <model_type>_model.pkl: fitted model
+        self.result_dir = result_dir
+        with open(self._filepath('meta.json'), encoding='utf-8') as f:
+            self.meta = json.load(f)
+
+    @staticmethod
+    def exists(result_dir):
+        # saved completely (see save)
+        return os.path.exists(os.path.join(result_dir, 'meta.json'))
+
+    @classmethod
+    def save(cls, result_dir, result, data_df):
+        # result: returned by Analyzer.run(), data_df: articles of its rows
+        # written into a temporary directory first, then moved into place
+        tmp_dir = f'{result_dir}.tmp-{uuid.uuid4().hex}'
+        os.makedirs(tmp_dir)
+        np.save(os.path.join(tmp_dir, 'ids.npy'), data_df['id'].to_numpy(dtype=np.int64))
+        with open(os.path.join(tmp_dir, 'articles.json'), mode='w', encoding='utf-8') as f:
+            json.dump({'title': data_df['title'].astype(str).tolist(),
+                       'link': data_df['link'].astype(str).tolist()}, f, ensure_ascii=False)
+
+        meta = {
+            'top_words': [[word, int(count)] for word, count in result['top_words']],
+            'n_articles': len(data_df),
+            'models': {},
+        }
+        for model_type, model_result in result['models'].items():
+            np.save(os.path.join(tmp_dir, f'{model_type}_topic_ratios.npy'),
+                    np.asarray(model_result['topic_ratios'], dtype=np.float32))
+            with open(os.path.join(tmp_dir, f'{model_type}_model.pkl'), 'wb') as f:
+                pickle.dump(model_result['model'], f)
+            meta['models'][model_type] = {
+                'topic_words': [list(words) for words in model_result['topic_words']],
+                'topic_words_filename': model_result['topic_words_filename'],
+                'topic_ratios_filename': model_result['topic_ratios_filename'],
+                'visualization_filename': model_result['visualization_filename'],
+            }
+        with open(os.path.join(tmp_dir, 'meta.json'), mode='w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False)
+
+        shutil.rmtree(result_dir, ignore_errors=True)
+        os.rename(tmp_dir, result_dir)
+        return cls(result_dir)
+
+    def _filepath(self, name):
+        return os.path.join(self.result_dir, name)
+
+    @property
+    def top_words(self):
+        return self.meta['top_words']
+
+    @property
+    def models(self):
+        # topic words and output filenames per model type
+        return self.meta['models']
+
+    def get_topic_ratios(self, model_type):
+        # memory-mapped, rows are read when sliced
+        return np.load(self._filepath(f'{model_type}_topic_ratios.npy'), mmap_mode='r')
+
+    def iter_topic_ratios(self, model_type, chunk_size=1000):
+        # rows of the topic ratio table: id, title, link and a ratio per topic
+        ids = np.load(self._filepath('ids.npy'))
+        with open(self._filepath('articles.json'), encoding='utf-8') as f:
+            articles = json.load(f)
+        topic_ratios = self.get_topic_ratios(model_type)
+        columns = [f'topic #{i+1}' for i in range(topic_ratios.shape[1])]
+        for start in range(0, len(ids), chunk_size):
+            rows = np.asarray(topic_ratios[start:start+chunk_size], dtype=float).tolist()
+            for i, row in enumerate(rows, start):
+                article = {'id': int(ids[i]), 'title': articles['title'][i], 'link': articles['link'][i]}
+                article.update(zip(columns, row))
+                yield article
+
+    def load_model(self, model_type):
+        # fitted models are only unpickled on demand
+        with open(self._filepath(f'{model_type}_model.pkl'), 'rb') as f:
+            return pickle.load(f)
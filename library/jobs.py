@@ -0,0 +1,182 @@
+import os
+import re
+import uuid
+import shutil
+import threading
+import traceback
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from library.constants import *
+from library.analyzer import OUTPUT_ROOT_DIRS
+from library.bot_analyzer import BotAnalyzer
+from library.job_result import JobResult, get_result_dir
+
+# output files of a job are written under <data or app/static>/jobs/<job id>/
+JOBS_DIR = 'jobs'
+
+
+class SharedCrawl:
+    def __init__(self, key):
+        # crawl of (keyword, industry), shared by the jobs searching the same articles
+        self.key = key
+        self.jobs = []
+        # job running the bot, chosen when the crawl starts
+        self.leader = None
+        self.future = None
+
+    @property
+    def stopped(self):
+        # only stops once every job waiting on it is stopped
+        return all(job.stopped for job in self.jobs)
+
+
+class JobManager:
+    def __init__(self, crawl_workers, analysis_workers, max_jobs):
+        # crawls and analyses run on separate pools, so that analyses don't wait behind crawls
+        self._crawl_executor = ThreadPoolExecutor(max_workers=max(crawl_workers, 1))
+        self._analysis_executor = ThreadPoolExecutor(max_workers=max(analysis_workers, 1))
+        # number of finished jobs kept, in memory and on disk (see get_result)
+        self.max_jobs = max_jobs
+        self._jobs = OrderedDict()
+        # running crawls by (keyword, industry), shared by jobs searching the same articles
+        self._crawls = {}
+        self._lock = threading.Lock()
+
+    @property
+    def latest_job_id(self):
+        with self._lock:
+            job_id = next(reversed(self._jobs), None)
+        # latest saved result if no job was run since restart
+        return job_id or self._find_latest_result()
+
+    @staticmethod
+    def get_output_dir(job_id):
+        return f'{JOBS_DIR}/{job_id}'
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def get_result(self, job_id):
+        # saved result of a completed job, also of jobs run before restart
+        if not job_id or not re.fullmatch(r'[0-9a-f]+', job_id):
+            return None
+        result_dir = get_result_dir(self.get_output_dir(job_id))
+        if not JobResult.exists(result_dir):
+            return None
+        return JobResult(result_dir)
+
+    def _find_latest_result(self):
+        jobs_dir = os.path.join('data', JOBS_DIR)
+        if not os.path.isdir(jobs_dir):
+            return None
+        saved = []
+        for entry in os.scandir(jobs_dir):
+            result_dir = get_result_dir(self.get_output_dir(entry.name))
+            if entry.is_dir() and JobResult.exists(result_dir):
+                saved.append((os.path.getmtime(os.path.join(result_dir, 'meta.json')), entry.name))
+        return max(saved)[1] if saved else None
+
+    def get_status(self, job_id):
+        job = self.get(job_id)
+        if job is None:
+            if self.get_result(job_id) is not None:
+                return {'status': BotAnalyzerStatus.COMPLETE, 'progress': 100}
+            return None
+        # jobs waiting for a shared crawl report its progress (also when its leader was stopped)
+        crawl = getattr(job, 'shared_crawl', None)
+        if job.status == BotAnalyzerStatus.QUEUED and crawl is not None and crawl.leader is not None \
+                and not crawl.future.done():
+            return {'status': BotAnalyzerStatus.CRAWLING, 'progress': crawl.leader.progress}
+        return {'status': job.status, 'progress': job.progress}
+
+    def submit(self, **params):
+        # validates params (raises errors) and queues a job, returns its id
+        job_id = uuid.uuid4().hex[:12]
+        job = BotAnalyzer(output_dir=self.get_output_dir(job_id), **params)
+        job.job_id = job_id
+        job.status = BotAnalyzerStatus.QUEUED
+
+        with self._lock:
+            self._jobs[job_id] = job
+            self._evict()
+            if job.needs_crawl:
+                key = (job.keyword, job.industry)
+                crawl = self._crawls.get(key)
+                if crawl is None:
+                    crawl = SharedCrawl(key)
+                    crawl.jobs.append(job)
+                    crawl.future = self._crawl_executor.submit(self._crawl, crawl)
+                    self._crawls[key] = crawl
+                else:
+                    print(f'job {job_id}: waiting for the same crawl of job {crawl.jobs[0].job_id}')
+                    crawl.jobs.append(job)
+                job.shared_crawl = crawl
+
+        if job.needs_crawl:
+            job.shared_crawl.future.add_done_callback(lambda future: self._on_crawled(job, future))
+        else:
+            self._analysis_executor.submit(job.analyze)
+        return job_id
+
+    def stop(self, job_id):
+        # a shared crawl keeps running until all of its jobs are stopped
+        job = self.get(job_id)
+        if job is not None:
+            job.stop()
+
+    def _crawl(self, crawl):
+        try:
+            # run by the first job not stopped yet, the others wait for it
+            with self._lock:
+                crawl.leader = next((job for job in crawl.jobs if not job.stopped), None)
+            if crawl.leader is None:
+                return False
+            return crawl.leader.crawl(is_stopped=lambda: crawl.stopped)
+        finally:
+            with self._lock:
+                self._crawls.pop(crawl.key, None)
+
+    def _on_crawled(self, job, future):
+        if job.stopped:
+            # also if stopped while starting the crawl as its leader
+            job.status = BotAnalyzerStatus.IDLE
+            return
+        err = future.exception()
+        if err is not None:
+            job.set_error(err, ''.join(traceback.format_exception(type(err), err, err.__traceback__)))
+            return
+        if not future.result():
+            # joined after the other jobs had stopped it
+            job.set_error(RuntimeError('The crawl was stopped before it finished, please run again.'), tb='')
+            return
+        job.status = BotAnalyzerStatus.QUEUED
+        self._analysis_executor.submit(job.analyze)
+
+    def _evict(self):
+        # forget the oldest finished jobs
+        finished = [job_id for job_id, job in self._jobs.items() if job.status not in BotAnalyzerStatus.PROCESSING]
+        for job_id in finished[:max(len(self._jobs) - self.max_jobs, 0)]:
+            del self._jobs[job_id]
+        self._prune_outputs()
+
+    def _prune_outputs(self):
+        # delete output files of the oldest finished jobs beyond max_jobs (also of jobs run before restart)
+        job_dirs = {}
+        for root_dir in set(OUTPUT_ROOT_DIRS.values()):
+            jobs_dir = os.path.join(root_dir, JOBS_DIR)
+            if not os.path.isdir(jobs_dir):
+                continue
+            for entry in os.scandir(jobs_dir):
+                if entry.is_dir():
+                    job_dirs.setdefault(entry.name, []).append(entry.path)
+        processing = {job_id for job_id, job in self._jobs.items() if job.status in BotAnalyzerStatus.PROCESSING}
+        # newest first
+        finished = sorted((job_id for job_id in job_dirs.keys() if job_id not in processing),
+                          key=lambda job_id: max(os.path.getmtime(path) for path in job_dirs[job_id]),
+                          reverse=True)
+        for job_id in finished[self.max_jobs:]:
+            for path in job_dirs[job_id]:
+                shutil.rmtree(path, ignore_errors=True)
+            print(f'job outputs deleted: {job_id}')
@@ -0,0 +1,114 @@
+import os
+import json
+import uuid
+import pickle
+import shutil
+
+
+class ResultCache:
+    def __init__(self, cache_dir, max_entries, max_bytes, as_json=False):
+        # one directory per key, evicted by least recent use
+        # as_json: results are JSON strings, stored as they are in result.json instead of pickled in result.pkl
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.as_json = as_json
+
+    @property
+    def enabled(self):
+        return self.max_entries > 0
+
+    def _entry_dir(self, key):
+        return os.path.join(self.cache_dir, key)
+
+    def _read_result(self, entry_dir):
+        if self.as_json:
+            with open(os.path.join(entry_dir, 'result.json'), encoding='utf-8') as f:
+                return f.read()
+        with open(os.path.join(entry_dir, 'result.pkl'), 'rb') as f:
+            return pickle.load(f)
+
+    def _write_result(self, entry_dir, result):
+        if self.as_json:
+            with open(os.path.join(entry_dir, 'result.json'), mode='w', encoding='utf-8') as f:
+                f.write(result)
+        else:
+            with open(os.path.join(entry_dir, 'result.pkl'), 'wb') as f:
+                pickle.dump(result, f)
+
+    def get(self, key, get_filepath=None):
+        # get_filepath: maps where an output file was written to where it is restored (default: the same path)
+        entry_dir = self._entry_dir(key)
+        if not self.enabled or not os.path.isdir(entry_dir):
+            return None
+        try:
+            with open(os.path.join(entry_dir, 'files.json'), encoding='utf-8') as f:
+                files = json.load(f)
+            result = self._read_result(entry_dir)
+            # restore output files to where they were written
+            for name, filepath in files.items():
+                if get_filepath is not None:
+                    filepath = get_filepath(filepath)
+                os.makedirs(os.path.dirname(filepath) or '.', exist_ok=True)
+                shutil.copyfile(os.path.join(entry_dir, name), filepath)
+            # mark as recently used
+            os.utime(entry_dir)
+        except (OSError, EOFError, pickle.UnpicklingError, json.JSONDecodeError):
+            # broken entry (ex. evicted while reading, or of an older format), written again by the next put
+            shutil.rmtree(entry_dir, ignore_errors=True)
+            return None
+
+        return result
+
+    def put(self, key, result, filepaths, replace=False):
+        # replace: overwrite an existing entry (ex. updated models), otherwise the first one is kept
+        if not self.enabled:
+            return
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+        # write into a temporary directory first, then move it into place
+        tmp_dir = os.path.join(self.cache_dir, f'.tmp-{uuid.uuid4().hex}')
+        os.makedirs(tmp_dir)
+        files = {}
+        for i, filepath in enumerate(filepaths):
+            name = f'{i}-{os.path.basename(filepath)}'
+            shutil.copyfile(filepath, os.path.join(tmp_dir, name))
+            files[name] = filepath
+        with open(os.path.join(tmp_dir, 'files.json'), mode='w', encoding='utf-8') as f:
+            json.dump(files, f, ensure_ascii=False)
+        self._write_result(tmp_dir, result)
+
+        entry_dir = self._entry_dir(key)
+        if replace and os.path.isdir(entry_dir):
+            old_dir = os.path.join(self.cache_dir, f'.tmp-{uuid.uuid4().hex}')
+            try:
+                os.rename(entry_dir, old_dir)
+            except OSError:
+                # replaced by another run meanwhile
+                pass
+            shutil.rmtree(old_dir, ignore_errors=True)
+        try:
+            os.rename(tmp_dir, entry_dir)
+        except OSError:
+            # already cached by another run
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+        self._evict()
+
+    @staticmethod
+    def _get_size(entry_dir):
+        return sum(entry.stat().st_size for entry in os.scandir(entry_dir) if entry.is_file())
+
+    def _evict(self):
+        entries = [entry for entry in os.scandir(self.cache_dir)
+                   if entry.is_dir() and not entry.name.startswith('.tmp-')]
+        # newest first
+        entries.sort(key=lambda entry: entry.stat().st_mtime, reverse=True)
+
+        total_bytes = 0
+        for i, entry in enumerate(entries):
+            total_bytes += self._get_size(entry.path)
+            # always keep the most recent entry
+            if i > 0 and (i >= self.max_entries or total_bytes > self.max_bytes):
+                shutil.rmtree(entry.path, ignore_errors=True)
+                print(f'result cache evicted: {entry.name}')
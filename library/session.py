@@ -0,0 +1,48 @@
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from fake_useragent import UserAgent
+
+from library.config import Config
+
+# read config
+cfg = Config()
+
+try:
+    # optional, lets urllib3 decode brotli compressed responses
+    import brotli
+    _ACCEPT_ENCODING = 'gzip, deflate, br'
+except ImportError:
+    _ACCEPT_ENCODING = 'gzip, deflate'
+
+_lock = threading.Lock()
+_session = None
+_user_agent = None
+
+
+def get_session():
+    # one pooled keep-alive session shared by url search and article crawling
+    global _session
+    with _lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=cfg.http_pool_size)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            session.headers['Accept-Encoding'] = _ACCEPT_ENCODING
+            _session = session
+    return _session
+
+
+def get_timeout():
+    # (connect, read) timeout of requests, so that a stalled host doesn't block a worker forever
+    return (cfg.connect_timeout, cfg.read_timeout)
+
+
+def get_random_user_agent():
+    # load the user agent list only once, then pick one in memory
+    global _user_agent
+    with _lock:
+        if _user_agent is None:
+            _user_agent = UserAgent()
+    return _user_agent.random
@@ -0,0 +1,106 @@
+import os
+import json
+import math
+import hashlib
+import threading
+import contextlib
+from concurrent.futures import ProcessPoolExecutor
+
+import MeCab
+
+from library.constants import *
+
+# MeCab.Tagger is not thread safe and loading a dictionary is slow,
+# so keep one tagger per thread (and per process after fork)
+_local = threading.local()
+
+
+def _get_tagger(dictionary_path):
+    if getattr(_local, 'pid', None) != os.getpid():
+        _local.pid = os.getpid()
+        _local.taggers = {}
+    if dictionary_path not in _local.taggers:
+        tagger = MeCab.Tagger(dictionary_path)
+        # workaround for broken node surfaces on the first parseToNode call
+        tagger.parse('')
+        _local.taggers[dictionary_path] = tagger
+    return _local.taggers[dictionary_path]
+
+
+def _extract_nouns_chunk(args):
+    # runs in a worker process (one tagger per worker)
+    dictionary_path, texts = args
+    return Tokenizer(dictionary_path).tokenize_many(texts, filter_stop_words=False)
+
+
+class Tokenizer:
+    def __init__(self, dictionary_path, stop_words=None):
+        self.dictionary_path = dictionary_path
+        self.stop_words = frozenset(stop_words or [])
+        # precomputed POS filters
+        self._pos = TOKENIZER_POS_RULES['pos']
+        self._excluded_pos_detail1 = frozenset(TOKENIZER_POS_RULES['excluded_pos_detail1'])
+        self._excluded_pos_detail2 = frozenset(TOKENIZER_POS_RULES['excluded_pos_detail2'])
+
+    @property
+    def fingerprint(self):
+        # everything except stop words that changes the extracted nouns
+        settings = [self.dictionary_path, TOKENIZER_POS_RULES]
+        return hashlib.sha1(json.dumps(settings, sort_keys=True).encode('utf-8')).hexdigest()
+
+    def extract_nouns(self, text):
+        # keep a reference to the text while walking its nodes
+        text = str(text).lower()
+        node = _get_tagger(self.dictionary_path).parseToNode(text)
+        nouns = []
+        while node:
+            # skip BOS/EOS nodes (stat 2 and 3)
+            if node.stat < 2:
+                pos, pos_detail1, pos_detail2, _ = node.feature.split(',', 3)
+                if (pos == self._pos
+                        and pos_detail1 not in self._excluded_pos_detail1
+                        and pos_detail2 not in self._excluded_pos_detail2):
+                    nouns.append(node.surface)
+            node = node.next
+        return nouns
+
+    def filter_stop_words(self, tokens):
+        stop_words = self.stop_words
+        return [word for word in tokens if word not in stop_words]
+
+    def tokenize(self, text):
+        return self.filter_stop_words(self.extract_nouns(text))
+
+    @staticmethod
+    @contextlib.contextmanager
+    def pool(n_jobs):
+        # worker processes shared by tokenize_many() calls in this block (None if not parallel)
+        if n_jobs <= 0:
+            n_jobs = os.cpu_count() or 1
+        if n_jobs == 1:
+            yield None
+            return
+        with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+            yield executor
+
+    def tokenize_many(self, texts, filter_stop_words=True, n_jobs=1, chunk_size=200, executor=None):
+        # executor: pool of n_jobs workers to use (see pool), created for this call if not given
+        texts = list(texts)
+        if n_jobs <= 0:
+            n_jobs = os.cpu_count() or 1
+
+        if n_jobs > 1 and (executor is not None or len(texts) > chunk_size):
+            # tokenize chunks across processes, keeping the input order
+            # (smaller chunks for fewer texts, so that all workers are busy)
+            chunk_size = max(min(chunk_size, math.ceil(len(texts)/n_jobs)), 1)
+            chunks = [(self.dictionary_path, texts[i:i+chunk_size]) for i in range(0, len(texts), chunk_size)]
+            with contextlib.ExitStack() as stack:
+                if executor is None:
+                    executor = stack.enter_context(ProcessPoolExecutor(max_workers=n_jobs))
+                nouns_list = [nouns for chunk in executor.map(_extract_nouns_chunk, chunks) for nouns in chunk]
+        else:
+            nouns_list = [self.extract_nouns(text) for text in texts]
+
+        if filter_stop_words:
+            return [self.filter_stop_words(nouns) for nouns in nouns_list]
+        return nouns_list
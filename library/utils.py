@@ -1,51 +1,87 @@
 import re
 import math
-import requests
 import urllib.parse
 from bs4 import BeautifulSoup
+from concurrent.futures import ThreadPoolExecutor
 
+from library.config import Config
+from library.crawler import get_host_bucket
+from library.session import get_session, get_timeout
 
-def _get_urls_per_industry(keyword, industry):
-    start_url = f'https://www.nikkei.com/pressrelease/?searchKeyword={keyword}&au={industry}'
-    result = requests.get(start_url)
+# read config
+cfg = Config()
+
+
+def _get(url):
+    # rate limited per host, shared with the article crawler
+    get_host_bucket(url).acquire_blocking()
+    return get_session().get(url, timeout=get_timeout())
+
+
+def _get_start_url(keyword, industry):
+    return f'https://www.nikkei.com/pressrelease/?searchKeyword={keyword}&au={industry}'
+
+
+def _get_n_items(start_url):
+    result = _get(start_url)
     assert result.status_code == 200, f'Status code error ({result.status_code})'
     soup = BeautifulSoup(result.content, features='html.parser')
 
     # get total number of items to calculate total pages
     n_items_text = soup.select('h2.m-headline_text span')[0].text
-    n_items = int(re.findall(r'\d+', n_items_text)[0])
-    n_pages = math.ceil(n_items/30)
+    return int(re.findall(r'\d+', n_items_text)[0])
 
-    urls = []
 
-    # get article items per page
-    for i in range(0, n_pages):
-        page_url = start_url + f'&hm={i+1}'
-        result = requests.get(page_url)
-        soup = BeautifulSoup(result.content, features='html.parser')
-        items = soup.find_all('li', 'm-newsListDotBorder_item')
+def _get_urls_per_page(page_url):
+    result = _get(page_url)
+    soup = BeautifulSoup(result.content, features='html.parser')
+    items = soup.find_all('li', 'm-newsListDotBorder_item')
 
-        for item in items:
-            # get article urls
-            href = item.find('a', 'm-newsListDotBorder_link').get('href')
-            urls.append(urllib.parse.urljoin('https://www.nikkei.com/', href))
+    urls = []
+    for item in items:
+        # get article urls
+        href = item.find('a', 'm-newsListDotBorder_link').get('href')
+        urls.append(urllib.parse.urljoin('https://www.nikkei.com/', href))
 
     return urls
 
 
-def get_urls_from_search(keyword, industry):
+def iter_urls_from_search(keyword, industry, on_n_items=None):
+    # on_n_items: called with the total number of items once known (before any url is yielded)
     # start a search
     assert 0 <= int(industry) <= 14, f'Industry must between 0~14 ({industry})'
 
-    urls = []
     if industry == 0:
         # get all entries by searching each industry
-        for industry_idx in range(1, 15):
-            urls += _get_urls_per_industry(keyword, industry_idx)
+        industries = range(1, 15)
     else:
         # get entries for only one industry
-        urls = _get_urls_per_industry(keyword, industry)
+        industries = [industry]
 
-    print(f'items found: {len(urls)}')
+    n_urls = 0
+    with ThreadPoolExecutor(max_workers=cfg.max_concurrency) as executor:
+        # get number of items (30 per page) of each industry concurrently
+        start_urls = [_get_start_url(keyword, industry_idx) for industry_idx in industries]
+        n_items_list = list(executor.map(_get_n_items, start_urls))
+        n_pages_list = [math.ceil(n_items/30) for n_items in n_items_list]
+        if on_n_items is not None:
+            on_n_items(sum(n_items_list))
 
-    return urls
+        # get article items of all pages concurrently,
+        # yielded in the order of industry and page as soon as they arrive
+        page_urls = [start_url + f'&hm={i+1}' for start_url, n_pages in zip(start_urls, n_pages_list)
+                     for i in range(0, n_pages)]
+        results = executor.map(_get_urls_per_page, page_urls)
+        try:
+            for urls in results:
+                n_urls += len(urls)
+                yield from urls
+        finally:
+            # cancel pending pages if stopped halfway
+            results.close()
+
+    print(f'items found: {n_urls}')
+
+
+def get_urls_from_search(keyword, industry):
+    return list(iter_urls_from_search(keyword, industry))
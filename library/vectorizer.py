@@ -0,0 +1,181 @@
+import os
+import numbers
+import itertools
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import scipy.sparse as sp
+from sklearn.feature_extraction.text import HashingVectorizer
+
+
+def _pass_through(tokens):
+    # analyzer for vectorizers fed with pre-tokenized documents
+    return tokens
+
+
+def _get_hashing_vectorizer(n_hash_features):
+    # raw term counts per hashed column
+    return HashingVectorizer(n_features=n_hash_features, alternate_sign=False, norm=None,
+                             analyzer=_pass_through, dtype=np.int64)
+
+
+def _count_batch(args):
+    # document frequency and total count of the hashed columns used in a batch
+    batch, n_hash_features = args
+    X = _get_hashing_vectorizer(n_hash_features).transform(batch).tocsc()
+    X.sum_duplicates()
+    columns = np.flatnonzero(np.diff(X.indptr))
+    df = np.diff(X.indptr)[columns]
+    tfs = np.asarray(X.sum(axis=0)).ravel()[columns]
+    return len(batch), columns, df, tfs
+
+
+def _select_batch(args):
+    # term counts of the selected hashed columns in a batch,
+    # and the counts of words falling into these columns (to name them)
+    batch, n_hash_features, hash_columns, with_words = args
+    hashing_vectorizer = _get_hashing_vectorizer(n_hash_features)
+    X = hashing_vectorizer.transform(batch).tocsc()[:, hash_columns].tocsr()
+    if not with_words:
+        return X, None
+
+    word_counts = Counter(word for tokens in batch for word in tokens)
+    words = list(word_counts.keys())
+    selected = set(hash_columns.tolist())
+    # one nonzero column per single-word document
+    word_columns = hashing_vectorizer.transform([[word] for word in words]).tocsr().indices if words else []
+    return X, {word: (int(column), word_counts[word])
+               for word, column in zip(words, word_columns) if column in selected}
+
+
+def _iter_batches(corpus, batch_size):
+    corpus = iter(corpus)
+    while True:
+        batch = list(itertools.islice(corpus, batch_size))
+        if not batch:
+            break
+        yield batch
+
+
+def _map_batches(func, args_iter, n_jobs):
+    # ordered map which keeps a few batches in flight only (the corpus is streamed)
+    if n_jobs <= 0:
+        n_jobs = os.cpu_count() or 1
+    if n_jobs == 1:
+        yield from map(func, args_iter)
+        return
+
+    with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+        futures = deque()
+        for args in args_iter:
+            futures.append(executor.submit(func, args))
+            if len(futures) >= n_jobs * 2:
+                yield futures.popleft().result()
+        while futures:
+            yield futures.popleft().result()
+
+
+def limit_features(X, feature_names, max_df=1.0, min_df=1, max_features=None, excluded_words=()):
+    # select columns of a term count matrix like CountVectorizer.fit_transform() does,
+    # returns the matrix with columns sorted by name and the names
+    n_docs = X.shape[0]
+    feature_names = np.asarray(feature_names, dtype=object)
+    df = np.asarray((X > 0).sum(axis=0)).ravel()
+    tfs = np.asarray(X.sum(axis=0)).ravel()
+    max_doc_count = max_df if isinstance(max_df, numbers.Integral) else max_df * n_docs
+    min_doc_count = min_df if isinstance(min_df, numbers.Integral) else min_df * n_docs
+    mask = (df > 0) & (df >= min_doc_count) & (df <= max_doc_count)
+    excluded_words = set(excluded_words)
+    mask &= np.array([word not in excluded_words for word in feature_names], dtype=bool)
+    columns = np.flatnonzero(mask)
+    if len(columns) == 0:
+        raise ValueError('After pruning, no terms remain. Try a lower min_df or a higher max_df.')
+    # alphabetical order, ties at the max_features limit are broken by name
+    columns = columns[np.argsort(feature_names[columns].astype(str), kind='stable')]
+    if max_features is not None and len(columns) > max_features:
+        columns = columns[np.sort(np.argsort(-tfs[columns], kind='stable')[:max_features])]
+    return X.tocsc()[:, columns].tocsr(), feature_names[columns].tolist()
+
+
+class HashingCountVectorizer:
+    def __init__(self, max_df=1.0, min_df=1, max_features=None,
+                 n_hash_features=2**20, batch_size=1000, n_jobs=1):
+        # term counts like CountVectorizer(analyzer=_pass_through), but memory is bounded by
+        # the number of hashed columns instead of the whole vocabulary of the corpus:
+        # 1st pass counts hashed columns, 2nd pass keeps the top ones and names them
+        # by their most frequent word (words sharing a column are merged)
+        self.max_df = max_df
+        self.min_df = min_df
+        self.max_features = max_features
+        self.n_hash_features = n_hash_features
+        self.batch_size = batch_size
+        self.n_jobs = n_jobs
+
+    def _select_columns(self, df, tfs, n_docs):
+        # same semantics as CountVectorizer._limit_features,
+        # returns selected columns and columns tied at the max_features limit (chosen by name later)
+        max_doc_count = self.max_df if isinstance(self.max_df, numbers.Integral) else self.max_df * n_docs
+        min_doc_count = self.min_df if isinstance(self.min_df, numbers.Integral) else self.min_df * n_docs
+        columns = np.flatnonzero((df > 0) & (df >= min_doc_count) & (df <= max_doc_count))
+        if len(columns) == 0:
+            raise ValueError('After pruning, no terms remain. Try a lower min_df or a higher max_df.')
+        tied_columns = columns[:0]
+        if self.max_features is not None and len(columns) > self.max_features:
+            min_tf = np.sort(tfs[columns])[::-1][self.max_features-1]
+            tied_columns = columns[tfs[columns] == min_tf]
+            columns = columns[tfs[columns] > min_tf]
+        return columns, tied_columns
+
+    def fit_transform(self, corpus):
+        # corpus: re-iterable tokenized documents, read twice
+        df = np.zeros(self.n_hash_features, dtype=np.int64)
+        tfs = np.zeros(self.n_hash_features, dtype=np.int64)
+        n_docs = 0
+        args_iter = ((batch, self.n_hash_features) for batch in _iter_batches(corpus, self.batch_size))
+        for batch_n_docs, columns, batch_df, batch_tfs in _map_batches(_count_batch, args_iter, self.n_jobs):
+            n_docs += batch_n_docs
+            df[columns] += batch_df
+            tfs[columns] += batch_tfs
+        columns, tied_columns = self._select_columns(df, tfs, n_docs)
+        hash_columns = np.sort(np.concatenate([columns, tied_columns]))
+        del df, tfs
+
+        matrices = []
+        word_counts = {}
+        args_iter = ((batch, self.n_hash_features, hash_columns, True)
+                     for batch in _iter_batches(corpus, self.batch_size))
+        for X, batch_word_counts in _map_batches(_select_batch, args_iter, self.n_jobs):
+            matrices.append(X)
+            for word, (column, count) in batch_word_counts.items():
+                column_counts = word_counts.setdefault(column, Counter())
+                column_counts[word] += count
+        X = sp.vstack(matrices).tocsr()
+
+        # name each column by its most frequent word, then sort columns alphabetically like CountVectorizer
+        names = [min(word_counts[column].items(), key=lambda item: (-item[1], item[0]))[0]
+                 for column in hash_columns.tolist()]
+        order = np.argsort(names, kind='stable')
+        if len(tied_columns):
+            # fill the rest of max_features with tied columns in alphabetical order
+            n_tied = self.max_features - len(columns)
+            tied = set(tied_columns.tolist())
+            tied_order = [i for i in order if hash_columns[i] in tied][:n_tied]
+            keep = set(tied_order) | {i for i in order if hash_columns[i] not in tied}
+            order = np.array([i for i in order if i in keep])
+        self.hash_columns_ = hash_columns[order]
+        self.feature_names_ = [names[i] for i in order]
+        self.vocabulary_ = {name: i for i, name in enumerate(self.feature_names_)}
+        return X[:, order]
+
+    def transform(self, corpus):
+        # corpus: tokenized documents, read once
+        args_iter = ((batch, self.n_hash_features, self.hash_columns_, False)
+                     for batch in _iter_batches(corpus, self.batch_size))
+        matrices = [X for X, _ in _map_batches(_select_batch, args_iter, self.n_jobs)]
+        if not matrices:
+            return sp.csr_matrix((0, len(self.hash_columns_)), dtype=np.int64)
+        return sp.vstack(matrices).tocsr()
+
+    def get_feature_names(self):
+        return list(self.feature_names_)
@@ -18,6 +18,7 @@ def print_help():
         f'$ python run.py app [PORT]\n'
         f'$ python run.py bot\n'
         f'$ python run.py analyzer\n'
+        f'$ python run.py sweep MIN_TOPICS MAX_TOPICS [STEP]\n'
         f'$ python run.py bot_analyzer\n'
     )
 
@@ -46,9 +47,27 @@ elif sys.argv[1] == 'analyzer':
                         n_features=cfg.n_features,
                         stop_words=cfg.stop_words,
                         n_top_words=cfg.n_top_words,
-                        n_topic_words=cfg.n_topic_words)
+                        n_topic_words=cfg.n_topic_words,
+                        filter_keywords=cfg.filter_keywords)
     analyzer.run()
 
+# compare numbers of topics
+elif sys.argv[1] == 'sweep':
+    try:
+        n_components_list = list(range(int(sys.argv[2]), int(sys.argv[3])+1, int(sys.argv[4]) if len(sys.argv) > 4 else 1))
+        assert len(n_components_list) > 0 and n_components_list[0] > 0
+    except (IndexError, ValueError, AssertionError):
+        print_help()
+        exit(-1)
+    analyzer = Analyzer(sql_query=cfg.sql_query,
+                        n_components=cfg.n_components,
+                        n_features=cfg.n_features,
+                        stop_words=cfg.stop_words,
+                        n_top_words=cfg.n_top_words,
+                        n_topic_words=cfg.n_topic_words,
+                        filter_keywords=cfg.filter_keywords)
+    analyzer.sweep(n_components_list)
+
 # run bot then analyzer
 elif sys.argv[1] == 'bot_analyzer':
     bot_analyzer = BotAnalyzer(keyword=cfg.keyword,
@@ -58,7 +77,8 @@ elif sys.argv[1] == 'bot_analyzer':
                                n_features=cfg.n_features,
                                stop_words=cfg.stop_words,
                                n_top_words=cfg.n_top_words,
-                               n_topic_words=cfg.n_topic_words)
+                               n_topic_words=cfg.n_topic_words,
+                               filter_keywords=cfg.filter_keywords)
     bot_analyzer.run()
 
 else:
@@ -0,0 +1,40 @@
+# parse throughput of article pages: full html.parser tree vs parse_article_page
+# usage: python -m tests.benchmark_extractor [N_PAGES] [N_RELATED]
+import sys
+import time
+
+from tests.test_extractor import read_fixture, parse_full_page
+from library import extractor
+
+
+def make_page(n_related):
+    # fixture padded with related articles, like the longer pages on the site
+    content = read_fixture('article_page.html').decode('utf-8')
+    item = '<li><a href="/pressrelease/article/?ng={i}">関連リリース{i}</a><p>概要{i}</p></li>\n'
+    related = ''.join(item.format(i=i) for i in range(n_related))
+    return content.replace('</ul>\n</aside>', related + '</ul>\n</aside>').encode('utf-8')
+
+
+def measure(parse, content, n_pages):
+    start = time.perf_counter()
+    for _ in range(n_pages):
+        soup = parse(content)
+        soup.find('h1', 'cmn-article_title')
+        soup.find('div', 'cmn-article_text').find_all('p')
+    return n_pages / (time.perf_counter() - start)
+
+
+def main():
+    n_pages = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    n_related = int(sys.argv[2]) if len(sys.argv) > 2 else 300
+    content = make_page(n_related)
+    print(f'{n_pages} pages of {len(content)//1024}KB, parser: {extractor.HTML_PARSER}')
+
+    full = measure(parse_full_page, content, n_pages)
+    targeted = measure(extractor.parse_article_page, content, n_pages)
+    print(f'full html.parser:   {full:8.1f} pages/s')
+    print(f'parse_article_page: {targeted:8.1f} pages/s ({targeted/full:.1f}x)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,115 @@
+# time of the result stage of Analyzer on synthetic data: row by row (as before) vs vectorized
+# usage: python -m tests.benchmark_results [N_ARTICLES ...] (row by row is only timed up to 10000 articles)
+import os
+import sys
+import time
+import tempfile
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+
+from library.analyzer import Analyzer
+
+N_FEATURES = 1000
+N_COMPONENTS = 10
+N_WORDS = 20
+# the row by row versions take minutes beyond this
+MAX_ROW_BY_ROW = 10000
+
+
+def make_analyzer(n_articles, seed=0):
+    # only the attributes used by the result stage (no tokenizer, no db)
+    rng = np.random.RandomState(seed)
+    analyzer = Analyzer.__new__(Analyzer)
+    analyzer.n_top_words = N_WORDS
+    analyzer.n_topic_words = N_WORDS
+    analyzer.output_dir = 'benchmark'
+    analyzer.tf = sp.random(n_articles, N_FEATURES, density=0.02, format='csr', random_state=rng,
+                            data_rvs=lambda n: rng.randint(1, 5, n)).astype(np.int64)
+    analyzer.feature_names = [f'word{i}' for i in range(N_FEATURES)]
+    analyzer.data_df = pd.DataFrame({'id': np.arange(n_articles),
+                                     'title': [f'title {i}' for i in range(n_articles)],
+                                     'link': [f'https://www.nikkei.com/article/{i}' for i in range(n_articles)]})
+    model = SimpleNamespace(components_=rng.rand(N_COMPONENTS, N_FEATURES))
+    topic_ratios = rng.dirichlet(np.ones(N_COMPONENTS), size=n_articles)
+    return analyzer, model, topic_ratios
+
+
+def get_top_words_row_by_row(analyzer):
+    total_counts = np.zeros(len(analyzer.feature_names))
+    for t in analyzer.tf:
+        total_counts += t.toarray()[0]
+    return sorted((zip(analyzer.feature_names, total_counts)), key=lambda x: x[1], reverse=True)[0:analyzer.n_top_words]
+
+
+def get_topic_words_argsort(analyzer, model, feature_names):
+    return [[feature_names[i] for i in topic.argsort()[:-analyzer.n_topic_words-1:-1]] for topic in model.components_]
+
+
+def create_topic_ratios_df_row_by_row(analyzer, topic_ratios):
+    df = pd.DataFrame(columns=[f'topic #{i+1}' for i in range(len(topic_ratios[0]))])
+    for i, ratios in enumerate(topic_ratios):
+        df.loc[i] = list(ratios)
+    return pd.concat([analyzer.data_df.loc[:, ['id', 'title', 'link']], df], axis=1)
+
+
+def save_topic_words_row_by_row(analyzer, topic_words, model_type):
+    df = pd.DataFrame(columns=['topic'] + [f'word #{i+1}' for i in range(len(topic_words[0]))])
+    for i, words in enumerate(topic_words):
+        df.loc[i] = [i] + list(words)
+    df.to_csv(os.path.join('data', f'{model_type}_topic_words.csv'), index=False, encoding='sjis')
+
+
+def measure(func, *args):
+    start = time.perf_counter()
+    func(*args)
+    return time.perf_counter() - start
+
+
+def run_stages(analyzer, model, topic_ratios, row_by_row):
+    # seconds per stage
+    if row_by_row:
+        top_words = measure(get_top_words_row_by_row, analyzer)
+        topic_words = measure(get_topic_words_argsort, analyzer, model, analyzer.feature_names)
+        topic_ratios_df = measure(create_topic_ratios_df_row_by_row, analyzer, topic_ratios)
+        save = measure(save_topic_words_row_by_row, analyzer, get_topic_words_argsort(analyzer, model, analyzer.feature_names), 'nmf')
+    else:
+        top_words = measure(analyzer.get_top_words)
+        topic_words = measure(analyzer.get_topic_words, model, analyzer.feature_names)
+        topic_ratios_df = measure(analyzer.create_topic_ratios_df, topic_ratios)
+        save = measure(analyzer.save_topic_words, analyzer.get_topic_words(model, analyzer.feature_names), 'nmf')
+    return {'get_top_words': top_words, 'get_topic_words': topic_words,
+            'create_topic_ratios_df': topic_ratios_df, 'save_topic_words': save}
+
+
+def main():
+    sizes = [int(arg) for arg in sys.argv[1:]] or [10000, 50000, 100000]
+    print(f'{N_FEATURES} features, {N_COMPONENTS} topics, {N_WORDS} words')
+
+    # output files are written into a temporary data/ directory
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        os.chdir(tmp_dir)
+        os.makedirs('data')
+        try:
+            for n_articles in sizes:
+                analyzer, model, topic_ratios = make_analyzer(n_articles)
+                vectorized = run_stages(analyzer, model, topic_ratios, row_by_row=False)
+                if n_articles <= MAX_ROW_BY_ROW:
+                    row_by_row = run_stages(analyzer, model, topic_ratios, row_by_row=True)
+                else:
+                    row_by_row = None
+                print(f'{n_articles} articles')
+                for stage, seconds in vectorized.items():
+                    line = f'  {stage:24s}{seconds*1000:10.1f} ms'
+                    if row_by_row is not None:
+                        line += f'  (row by row: {row_by_row[stage]*1000:10.1f} ms)'
+                    print(line)
+        finally:
+            os.chdir(cwd)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,115 @@
+import time
+import threading
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from library import bot as bot_module
+from library import crawler
+from library.bot import Bot
+from library.crawler import AsyncCrawler, TokenBucket
+
+
+class SlowHandler(BaseHTTPRequestHandler):
+    # answers every request after `delay` seconds, counting requests in flight
+    delay = 0.1
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.n_requests += 1
+            server.n_active += 1
+            server.max_active = max(server.max_active, server.n_active)
+            server.started_at.append(time.monotonic())
+        try:
+            time.sleep(self.delay)
+            body = self.path.encode()
+            self.send_response(200)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        finally:
+            with server.lock:
+                server.n_active -= 1
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), SlowHandler)
+    server.daemon_threads = True
+    server.lock = threading.Lock()
+    server.n_requests = 0
+    server.n_active = 0
+    server.max_active = 0
+    server.started_at = []
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def get_urls(server, n):
+    host, port = server.server_address
+    return [f'http://{host}:{port}/{i}' for i in range(n)]
+
+
+def fetch(url):
+    with urllib.request.urlopen(url, timeout=5) as response:
+        return response.read().decode()
+
+
+def use_bucket(monkeypatch, bucket):
+    monkeypatch.setattr(crawler, 'get_host_bucket', lambda url: bucket)
+
+
+def test_crawl_all_urls(monkeypatch, server):
+    use_bucket(monkeypatch, TokenBucket(rate=0, capacity=1))
+    urls = get_urls(server, 10)
+    results = list(AsyncCrawler(fetch=fetch, max_concurrency=4).iterate(urls))
+
+    assert sorted(results) == sorted((url, '/' + url.rsplit('/', 1)[1]) for url in urls)
+
+
+def test_concurrency_is_bounded(monkeypatch, server):
+    use_bucket(monkeypatch, TokenBucket(rate=0, capacity=1))
+    list(AsyncCrawler(fetch=fetch, max_concurrency=3).iterate(get_urls(server, 12)))
+
+    assert server.n_requests == 12
+    assert server.max_active == 3
+
+
+def test_requests_are_rate_limited(monkeypatch, server):
+    rate = 20
+    use_bucket(monkeypatch, TokenBucket(rate=rate, capacity=1))
+    list(AsyncCrawler(fetch=fetch, max_concurrency=8).iterate(get_urls(server, 10)))
+
+    # one token at start, then one every 1/rate seconds
+    elapsed = server.started_at[-1] - server.started_at[0]
+    assert elapsed >= 9 / rate * 0.9
+
+
+def test_closing_generator_cancels_pending_requests(monkeypatch, server):
+    use_bucket(monkeypatch, TokenBucket(rate=0, capacity=1))
+    results = AsyncCrawler(fetch=fetch, max_concurrency=2).iterate(get_urls(server, 20))
+    next(results)
+    results.close()
+    n_requests = server.n_requests
+    time.sleep(SlowHandler.delay * 3)
+
+    # only requests already running when closed were sent
+    assert n_requests <= 3
+    assert server.n_requests == n_requests
+
+
+def test_crawl_page_timeout_is_failed_page(monkeypatch, server):
+    monkeypatch.setattr(bot_module, 'get_timeout', lambda: (1, SlowHandler.delay / 10))
+    monkeypatch.setattr(bot_module, 'get_random_user_agent', lambda: 'test')
+
+    assert Bot(keyword='', industry=0)._crawl_page(get_urls(server, 1)[0]) is None
@@ -0,0 +1,76 @@
+import os
+
+import pytest
+from bs4 import BeautifulSoup
+
+from library import bot as bot_module
+from library import extractor
+from library.bot import Bot
+
+FIXTURE_DIR = os.path.join(os.path.dirname(__file__), 'fixtures')
+ARTICLE_URL = 'https://www.nikkei.com/pressrelease/article/?R_FLG=0&bf=0&ng=NR0000001'
+PARSERS = ['html.parser'] + (['lxml'] if extractor.HTML_PARSER == 'lxml' else [])
+
+
+def read_fixture(name):
+    with open(os.path.join(FIXTURE_DIR, name), 'rb') as f:
+        return f.read()
+
+
+class FakeResponse:
+    def __init__(self, content, status_code=200):
+        self.content = content
+        self.status_code = status_code
+
+
+class FakeSession:
+    def __init__(self, content):
+        self.content = content
+
+    def get(self, url, headers=None, timeout=None):
+        return FakeResponse(self.content)
+
+
+def parse_full_page(content):
+    # the whole page with html.parser, as before parse_article_page
+    return BeautifulSoup(content, features='html.parser')
+
+
+def crawl_fixture(monkeypatch, content, industry, parse):
+    monkeypatch.setattr(bot_module, 'get_session', lambda: FakeSession(content))
+    monkeypatch.setattr(bot_module, 'parse_article_page', parse)
+    return Bot(keyword='', industry=industry)._crawl_page(ARTICLE_URL)
+
+
+@pytest.mark.parametrize('parser', PARSERS)
+@pytest.mark.parametrize('industry', [0, 1])
+def test_crawl_page_equals_full_parse(monkeypatch, parser, industry):
+    content = read_fixture('article_page.html')
+    expected = crawl_fixture(monkeypatch, content, industry, parse_full_page)
+    monkeypatch.setattr(extractor, 'HTML_PARSER', parser)
+    article = crawl_fixture(monkeypatch, content, industry, extractor.parse_article_page)
+
+    assert expected is not None
+    assert article == expected
+    assert list(article.keys()) == list(expected.keys())
+
+
+def test_crawl_page_fields(monkeypatch):
+    article = crawl_fixture(monkeypatch, read_fixture('article_page.html'), 0, extractor.parse_article_page)
+
+    assert article['title'] == 'テスト食品、新商品「お試し&スープ」を発売'
+    assert article['link'] == 'https://www.nikkei.com/pressrelease/article/'
+    assert article['date'] == '2019/11/15 10:30'
+    assert article['industry'] == '食品'
+    assert article['content'].startswith('テスト食品株式会社は')
+    assert '参考画像' not in article['content']
+    assert 'https://' not in article['content']
+
+
+def test_parse_article_page_keeps_needed_parts_only():
+    soup = extractor.parse_article_page(read_fixture('article_page.html'))
+
+    assert soup.find('aside') is None
+    assert soup.find('footer') is None
+    assert soup.find('h1', 'l-header_logo') is None
+    assert len(soup.find_all('h1', 'cmn-article_title')) == 1